@@ -8,7 +8,15 @@ import os
 import sys
 import re
 import shutil
-import glob
+import hashlib
+import json
+import functools
+
+# Optional fast JSON serializer for AST dumps
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 # Add the src directory to Python path
@@ -31,9 +39,69 @@ from static_data_obfuscator import transform_static_to_dynamic
 from scalar_splitter import split_scalar_variables
 from local_state_obfuscator import convert_locals_to_state
 from opaque_predicate_obfuscator import OpaquePredicateInserter
+from ast_cache import compile_standard_json
 
 # BiAn-style AST regeneration: create fresh AST from current source after each transformation
 
+# Source hash -> AST json path, so an unchanged source is never recompiled
+_AST_CACHE = {}
+
+# AST json path -> parsed AST dict of the current step only. Passes get the dict
+# directly instead of re-reading JSON from disk; the file itself is only written with
+# BIAN_PERSIST_AST=1. Earlier steps' ASTs are never read again, so they are dropped.
+_AST_OBJECTS = {}
+
+
+# Step files (source snapshots, AST dumps) written by the current run_demo call; cleanup
+# only ever removes these, never other runs' output
+_RUN_FILES = []
+
+
+def _set_current_ast(path: str, ast_obj) -> None:
+    _AST_OBJECTS.clear()
+    _AST_OBJECTS[path] = ast_obj
+
+
+def _persist_ast() -> bool:
+    return os.getenv("BIAN_PERSIST_AST", "0") == "1"
+
+
+def _keep_snapshots() -> bool:
+    # Source snapshots are only for inspection: solc gets the content inline
+    return os.getenv("BIAN_KEEP_SNAPSHOTS", "0") == "1" or os.getenv("BIAN_CLEANUP_TEMPS", "1") != "1"
+
+
+def load_ast(path: str):
+    """Return the AST for path from memory, else parse it from disk; None if unavailable."""
+    if not path:
+        return None
+    ast_obj = _AST_OBJECTS.get(path)
+    if ast_obj is None and os.path.exists(path):
+        with open(path, "rb") as f:
+            ast_obj = json.loads(f.read())
+        _set_current_ast(path, ast_obj)
+    return ast_obj
+
+
+def _ast_available(path: str) -> bool:
+    return bool(path) and (path in _AST_OBJECTS or os.path.exists(path))
+
+
+def _source_digest(source_code: str) -> str:
+    return hashlib.blake2b(source_code.encode("utf-8"), digest_size=16).hexdigest()
+
+_PRAGMA_RE = re.compile(r'pragma\s+solidity\s+([^;]+);')
+_STRIP_RANGE_RE = re.compile(r'[\^>=<]')
+_SEMVER_RE = re.compile(r'^\d+\.\d+\.\d+$')
+
+@functools.lru_cache(maxsize=32)
+def _version_from_pragma(version_str: str):
+    """Concrete X.Y.Z named by a pragma's version expression, or None (cached per pragma text)."""
+    # Remove caret or other simple prefixes
+    clean_ver = _STRIP_RANGE_RE.sub('', version_str).split()[0] # Take first part if range
+    # Validate if it looks like a version
+    return clean_ver if _SEMVER_RE.match(clean_ver) else None
+
 def _detect_solc_version(source_code: str) -> str:
     """
     Detects the solidity version from the source code pragma.
@@ -47,14 +115,10 @@ def _detect_solc_version(source_code: str) -> str:
     # pragma solidity >=0.4.22 <0.9.0; -> We just pick the first one 0.4.22? No, that might be too old.
     # Let's look for the first concrete X.Y.Z
     
-    match = re.search(r'pragma\s+solidity\s+([^;]+);', source_code)
+    match = _PRAGMA_RE.search(source_code)
     if match:
-        version_str = match.group(1).strip()
-        # Remove caret or other simple prefixes
-        clean_ver = re.sub(r'[\^>=<]', '', version_str).split()[0] # Take first part if range
-        
-        # Validate if it looks like a version
-        if re.match(r'^\d+\.\d+\.\d+$', clean_ver):
+        clean_ver = _version_from_pragma(match.group(1).strip())
+        if clean_ver:
             print(f"[INFO] Detected Solidity version: {clean_ver}")
             return clean_ver
             
@@ -62,27 +126,44 @@ def _detect_solc_version(source_code: str) -> str:
     return "0.8.30"
 
 
+def _dump_ast_bytes(ast_obj) -> bytes:
+    """Serialize an AST to compact UTF-8 JSON (orjson if available, else stdlib json)."""
+    if orjson is not None:
+        return orjson.dumps(ast_obj)
+    return json.dumps(ast_obj, ensure_ascii=False).encode("utf-8")
+
+
+@functools.lru_cache(maxsize=8)
+def _ensure_solc_installed(solc_version: str) -> None:
+    """Install and select solc_version once per run; later calls are free."""
+    from solcx import install_solc, set_solc_version
+    install_solc(solc_version)
+    set_solc_version(solc_version)
+
+
 def _regenerate_ast_from_source(source_code: str, source_file_path: str, ast_output_path: str, solc_version: str) -> bool:
 
     """
     Regenerate AST from current source code (BiAn approach).
-    Write source to temp file, compile to get fresh AST, save AST to output path.
+    Compile the source (passed inline) to get a fresh AST and keep it in memory;
+    the source snapshot and AST file are only written when asked for.
     Returns True if successful, False otherwise.
     """
     try:
         # Lazy import to avoid hard dependency
-        from solcx import install_solc, set_solc_version, compile_standard, compile_files, get_installed_solc_versions # Added compile_files, get_installed_solc_versions
+        from solcx import compile_standard
         # Ensure specific version is installed
         try:
-            install_solc(solc_version)
-            set_solc_version(solc_version)
+            _ensure_solc_installed(solc_version)
         except Exception as e:
             print(f"[WARN] Failed to install/set solc version {solc_version}: {e}")
         
-        # Write current source to snapshot file for this step
-        os.makedirs(os.path.dirname(source_file_path), exist_ok=True)
-        with open(source_file_path, "w", encoding="utf-8") as f:
-            f.write(source_code)
+        # Write current source to snapshot file for this step (inspection only)
+        if _keep_snapshots():
+            os.makedirs(os.path.dirname(source_file_path), exist_ok=True)
+            with open(source_file_path, "w", encoding="utf-8") as f:
+                f.write(source_code)
+            _RUN_FILES.append(source_file_path)
         
         # Compile source to get fresh AST
         std_input = {
@@ -90,25 +171,46 @@ def _regenerate_ast_from_source(source_code: str, source_file_path: str, ast_out
             "sources": { source_file_path: { "content": source_code } },
             "settings": { "outputSelection": { source_file_path: { "": ["ast"] } } }
         }
-        result = compile_standard(std_input, allow_paths=os.path.dirname(source_file_path))
+        allow_paths = os.path.dirname(source_file_path)
+        # Same solc driver as the control-flow passes' AST cache; solcx if no binary
+        result = compile_standard_json(std_input, solc_version, allow_paths=allow_paths)
+        if result is None:
+            result = compile_standard(std_input, allow_paths=allow_paths)
         ast_obj = result["sources"][source_file_path]["ast"]
+        _set_current_ast(ast_output_path, ast_obj)
         
         # Save fresh AST
-        os.makedirs(os.path.dirname(ast_output_path), exist_ok=True)
-        import json as _json
-        with open(ast_output_path, "w", encoding="utf-8") as out:
-            _json.dump(ast_obj, out, ensure_ascii=False, indent=2)
+        if _persist_ast():
+            os.makedirs(os.path.dirname(ast_output_path), exist_ok=True)
+            # Compact JSON in one bulk write: indent=2 roughly doubled the size
+            # and json.dump() streams it through TextIOWrapper in small chunks
+            with open(ast_output_path, "wb", buffering=1 << 20) as out:
+                out.write(_dump_ast_bytes(ast_obj))
+            _RUN_FILES.append(ast_output_path)
         
         return True
     except Exception as e:
         print(f"[WARN] Could not regenerate AST: {e}")
         return False
 
-# Initial AST generation (for first step only)
-def _ensure_initial_ast(sol_file: str, out_json: str, solc_version: str) -> None:
-    with open(sol_file, "r", encoding="utf-8") as f:
-        source = f.read()
+def _place_file(src: str, dst: str, move: bool) -> None:
+    """
+    Put src at dst: rename if src is disposable, else copy. The copy goes through a
+    temp name and os.replace, so dst never shares an inode with a step file that a
+    later run truncates and rewrites.
+    """
+    if move:
+        try:
+            os.replace(src, dst)
+            return
+        except OSError:
+            pass
+    tmp_path = f"{dst}.{os.getpid()}.tmp"
+    shutil.copyfile(src, tmp_path)
+    os.replace(tmp_path, dst)
 
+# Initial AST generation (for first step only)
+def _ensure_initial_ast(source: str, out_json: str, solc_version: str) -> None:
     step0_path = os.path.join('test', 'test_step0.sol')
     if not _regenerate_ast_from_source(source, step0_path, out_json, solc_version):
         print("[WARN] Could not regenerate initial AST; proceeding with previous version if available.")
@@ -123,19 +225,15 @@ def run_demo(input_file: str, output_file: str):
         current_source = f.read()
 
     print("[INFO] Starting BiAn-style progressive obfuscation pipeline...")
+    _RUN_FILES.clear()
     
     # Initialize AST
     # Detect version first
-    with open(input_file, 'r', encoding='utf-8') as f:
-        initial_source = f.read()
-    
-    detected_version = _detect_solc_version(initial_source)
+    detected_version = _detect_solc_version(current_source)
     
     # Pre-install to avoid delays later
     try:
-        from solcx import install_solc, set_solc_version
-        install_solc(detected_version)
-        set_solc_version(detected_version)
+        _ensure_solc_installed(detected_version)
     except Exception as e:
         print(f"[ERROR] Failed to install/set solc version {detected_version}: {e}")
         return
@@ -145,16 +243,29 @@ def run_demo(input_file: str, output_file: str):
     # Generate initial AST
     current_ast_path = os.path.join('test', 'test_ast_step0.json')
     print(f"[INFO] Generating initial AST for {input_file}...")
-    _ensure_initial_ast(input_file, current_ast_path, solc_version=detected_version)
+    _ensure_initial_ast(current_source, current_ast_path, solc_version=detected_version)
+    if _ast_available(current_ast_path):
+        _AST_CACHE[_source_digest(current_source)] = current_ast_path
 
     step_counter = 0
     static_only = os.getenv("BIAN_STATIC_ONLY", "0") == "1"
+    # Set when a text-only step changed the source without rebuilding the AST
+    ast_stale = False
+    stale_source = None
+    stale_step_name = None
+
+    def _refresh_ast(source_code: str, step_name: str):
+        nonlocal current_ast_path, ast_stale
+        ast_stale = False
+
+        # Same source as an earlier step -> reuse its AST
+        digest = _source_digest(source_code)
+        cached_path = _AST_CACHE.get(digest)
+        if _ast_available(cached_path):
+            print(f"[AST] Source unchanged after {step_name}, reusing {cached_path}")
+            current_ast_path = cached_path
+            return current_ast_path
 
-    # Helper function for progressive transformation
-    def next_step(source_code: str, step_name: str):
-        nonlocal step_counter, current_ast_path
-        step_counter += 1
-        
         # Create temp file for current source
         step_source_path = os.path.join('test', f'test_step{step_counter}.sol')
         new_ast_path = os.path.join('test', f'test_ast_step{step_counter}.json')
@@ -162,13 +273,41 @@ def run_demo(input_file: str, output_file: str):
         # Regenerate AST from current source (BiAn approach)
         if _regenerate_ast_from_source(source_code, step_source_path, new_ast_path, solc_version=detected_version):
             print(f"[AST] Regenerated AST after {step_name} -> {new_ast_path}")
+            _AST_CACHE[digest] = new_ast_path
             current_ast_path = new_ast_path
         else:
             print(f"[WARN] AST regeneration failed for {step_name}, using previous AST")
         
         return current_ast_path
 
-    
+    # Helper function for progressive transformation
+    def next_step(source_code: str, step_name: str, needs_ast: bool = True):
+        """
+        Record a finished step. needs_ast=False is for text-only steps whose output is
+        not read as an AST by the following step; the AST is then rebuilt lazily by
+        ensure_ast() right before the next AST consumer runs.
+        """
+        nonlocal step_counter, ast_stale, stale_source, stale_step_name
+        step_counter += 1
+        if not needs_ast:
+            ast_stale = True
+            stale_source = source_code
+            stale_step_name = step_name
+            return current_ast_path
+        return _refresh_ast(source_code, step_name)
+
+    def ensure_ast():
+        """Return an AST path matching the latest source, rebuilding it if deferred."""
+        if ast_stale:
+            return _refresh_ast(stale_source, stale_step_name)
+        return current_ast_path
+
+    # The passes below run strictly in sequence: each one rewrites the output of the
+    # previous one (e.g. integer obfuscation must see the literals that static/boolean
+    # obfuscation introduced), so they cannot be run on separate copies and merged.
+    # Text-only passes instead skip the AST rebuild (see next_step/ensure_ast); to
+    # process many contracts at once, run files in parallel
+    # (SolidityASTParser.compile_batch does this for the compile step).
     
     # Step 0: Pre-processing (Modifier & Internal Function Inlining)
     enable_preprocessing = os.getenv("BIAN_ENABLE_PREPROCESSING", "1") == "1"
@@ -234,7 +373,7 @@ def run_demo(input_file: str, output_file: str):
     enable_local_state = os.getenv("BIAN_ENABLE_LOCAL_STATE", "1") == "1"
     if enable_local_state:
         try:
-            promoted_source, promoted_count = convert_locals_to_state(current_source, current_ast_path)
+            promoted_source, promoted_count = convert_locals_to_state(current_source, current_ast_path, ast=load_ast(current_ast_path))
             if promoted_count > 0:
                 current_source = promoted_source
                 current_ast_path = next_step(current_source, "local-to-state promotion")
@@ -284,9 +423,11 @@ def run_demo(input_file: str, output_file: str):
         print("[INFO] Integer obfuscation skipped (static-only mode).")
     else:
         try:
-            integer_obfuscated = obfuscate_integers_preserve_pragma(current_source)
+            # BIAN_INT_UNIQUE=0 reuses one expression per distinct literal (faster on large contracts)
+            unique_ints = os.getenv("BIAN_INT_UNIQUE", "1") == "1"
+            integer_obfuscated = obfuscate_integers_preserve_pragma(current_source, unique=unique_ints)
             current_source = integer_obfuscated
-            current_ast_path = next_step(current_source, "integer obfuscation")
+            current_ast_path = next_step(current_source, "integer obfuscation", needs_ast=False)
             print("[OK] Integer obfuscation done.")
         except Exception as e:
             print(f"[WARN] Integer obfuscation failed: {e}")
@@ -299,7 +440,8 @@ def run_demo(input_file: str, output_file: str):
         print("[INFO] Scalar splitting disabled (set BIAN_ENABLE_SCALAR=1 to enable).")
     else:
         try:
-            scalar_obfuscated, scalar_count = split_scalar_variables(current_source, current_ast_path)
+            current_ast_path = ensure_ast()
+            scalar_obfuscated, scalar_count = split_scalar_variables(current_source, current_ast_path, ast=load_ast(current_ast_path))
             if scalar_count > 0:
                 current_source = scalar_obfuscated
                 current_ast_path = next_step(current_source, "scalar splitting")
@@ -317,7 +459,7 @@ def run_demo(input_file: str, output_file: str):
         try:
             comment_removed = run_comment_removal(source_text=current_source)
             current_source = comment_removed
-            current_ast_path = next_step(current_source, "comment removal")
+            current_ast_path = next_step(current_source, "comment removal", needs_ast=False)
             print("[OK] Comment removal done.")
         except Exception as e:
             print(f"[WARN] Comment removal failed: {e}")
@@ -335,7 +477,7 @@ def run_demo(input_file: str, output_file: str):
                 one_line=True
             )
              current_source = scrambled_code
-             current_ast_path = next_step(current_source, "format scrambling")
+             current_ast_path = next_step(current_source, "format scrambling", needs_ast=False)
              print("[OK] Format scrambling done.")
         else:
             print("[INFO] Format scrambling disabled (set BIAN_ENABLE_FORMATTING=1 to enable).")
@@ -349,7 +491,8 @@ def run_demo(input_file: str, output_file: str):
                 solc_version='0.8.30'
             )
             # Pass current source directly instead of file path
-            renamed_code = renamer.obfuscate_from_source(current_source, current_ast_path)
+            current_ast_path = ensure_ast()
+            renamed_code = renamer.obfuscate_from_source(current_source, current_ast_path, ast=load_ast(current_ast_path))
             current_source = renamed_code
             current_ast_path = next_step(current_source, "variable renaming")
             print("[OK] Variable renaming done.")
@@ -364,28 +507,47 @@ def run_demo(input_file: str, output_file: str):
         print(f"[ERROR] Failed to write output file: {e}")
 
     # Copy final AST to main test_ast.json for backward compatibility
+    current_ast_path = ensure_ast()
+    cleanup_temps = os.getenv("BIAN_CLEANUP_TEMPS", "1") == "1"
+    final_ast_path = os.path.join('test', 'test_ast.json')
     try:
-        import shutil
-        final_ast_path = os.path.join('test', 'test_ast.json')
-        shutil.copy2(current_ast_path, final_ast_path)
+        ast_obj = _AST_OBJECTS.get(current_ast_path)
+        if os.path.abspath(current_ast_path) == os.path.abspath(final_ast_path):
+            pass
+        elif ast_obj is not None and not _persist_ast():
+            # Step AST only lives in memory (BIAN_PERSIST_AST=0): dump it once here
+            with open(final_ast_path, "wb", buffering=1 << 20) as out:
+                out.write(_dump_ast_bytes(ast_obj))
+        else:
+            # Step files are kept when persisted, so only move them if they'd be cleaned up
+            _place_file(current_ast_path, final_ast_path, move=cleanup_temps and not _persist_ast())
         print(f"[AST] Final AST copied to: {final_ast_path}")
     except Exception as e:
         print(f"[WARN] Could not copy final AST: {e}")
 
     # Optional cleanup: remove temporary files
-    cleanup_temps = os.getenv("BIAN_CLEANUP_TEMPS", "1") == "1"
     if cleanup_temps:
         try:
-            import glob
-            temp_files = glob.glob('test/temp_step*.sol')
-            for f in temp_files:
-                if os.path.exists(f):
-                    os.remove(f)
-            print(f"[OK] Cleaned up {len(temp_files)} temporary files")
+            # Only files this run wrote; step snapshots/ASTs are kept when explicitly requested
+            keep_snapshots = _keep_snapshots()
+            persist_ast = _persist_ast()
+            removed = 0
+            for path in _RUN_FILES:
+                if keep_snapshots if path.endswith('.sol') else persist_ast:
+                    continue
+                try:
+                    os.unlink(path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+            print(f"[OK] Cleaned up {removed} temporary files")
         except Exception as e:
             print(f"[WARN] Cleanup failed: {e}")
 
-    print(f"\n[OK] BiAn-style obfuscation completed! Final AST: {current_ast_path} -> test_ast.json")
+    if os.path.exists(final_ast_path):
+        print(f"\n[OK] BiAn-style obfuscation completed! Final AST: {final_ast_path}")
+    else:
+        print("\n[OK] BiAn-style obfuscation completed!")
 
 if __name__ == "__main__":
     input_path = 'test/test.sol'
@@ -3,3 +3,4 @@ from .opaque_predicate_obfuscator import OpaquePredicateInserter
 from .chaotic_map_generator import ChaoticMapGenerator
 from .flattening_obfuscator import FlatteningObfuscator
 from .preprocessing_obfuscator import PreprocessingObfuscator
+from .ast_cache import get_ast_cached
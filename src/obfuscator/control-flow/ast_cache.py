@@ -0,0 +1,247 @@
+"""
+Shared solc AST cache for the control-flow obfuscators.
+Compiling is by far the most expensive part of a pass, and several passes often
+ask for the AST of the same source. ASTs are cached by (sha256(source), solc version):
+in memory for the current process and, gzip-compressed, on disk between runs.
+The returned dicts are shared between callers and must be treated as read-only.
+On a miss solc is run directly with a standard-json input that only asks for the
+AST, and its output is parsed with orjson when installed. solcx's compile
+functions are the fallback when the solc binary can't be resolved.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from solcx import compile_source, compile_files
+except ImportError:
+    compile_source = compile_files = None
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# Set BIAN_AST_CACHE_DIR to an empty string to disable the on-disk cache
+AST_CACHE_DIR = os.getenv("BIAN_AST_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "bian_obf", "ast"))
+
+# In-memory LRU of the most recently used ASTs; older ones are still on disk
+_MEMORY_CACHE_SIZE = 32
+_memory_cache: "OrderedDict[Tuple[str, str], dict]" = OrderedDict()
+
+
+def _memory_get(key: str, solc_version: str) -> Optional[dict]:
+    ast = _memory_cache.get((key, solc_version))
+    if ast is not None:
+        _memory_cache.move_to_end((key, solc_version))
+    return ast
+
+
+def _memory_put(key: str, solc_version: str, ast: dict) -> None:
+    _memory_cache[(key, solc_version)] = ast
+    _memory_cache.move_to_end((key, solc_version))
+    while len(_memory_cache) > _MEMORY_CACHE_SIZE:
+        _memory_cache.popitem(last=False)
+
+
+def _disk_path(key: str, solc_version: str) -> str:
+    return os.path.join(AST_CACHE_DIR, f"{key}-{solc_version}.json.gz")
+
+
+def _load_from_disk(key: str, solc_version: str) -> Optional[dict]:
+    if not AST_CACHE_DIR:
+        return None
+    try:
+        with gzip.open(_disk_path(key, solc_version), "rb") as f:
+            return _json_loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def _store_on_disk(key: str, solc_version: str, ast: dict) -> None:
+    if not AST_CACHE_DIR:
+        return
+    try:
+        os.makedirs(AST_CACHE_DIR, exist_ok=True)
+        path = _disk_path(key, solc_version)
+        # Write to a temp name first so a concurrent reader never sees a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(tmp_path, "wb", compresslevel=1) as f:
+            f.write(json.dumps(ast, ensure_ascii=False).encode("utf-8"))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"[WARN] Could not write AST cache: {e}")
+
+
+@lru_cache(maxsize=None)
+def _solc_binary(solc_version: str) -> Optional[str]:
+    try:
+        from solcx.install import get_executable
+        return str(get_executable(solc_version))
+    except Exception:
+        return None
+
+
+def compile_standard_json(std_input: dict, solc_version: str, allow_paths: Optional[str] = None) -> Optional[dict]:
+    """
+    Run `solc --standard-json` on std_input with the binary solcx installed for
+    solc_version, skipping the version probe and path lookups solcx repeats on every
+    compile_standard() call. Returns solc's output, or None if the binary can't be
+    resolved so callers can fall back to solcx. Raises RuntimeError on compile errors.
+    """
+    binary = _solc_binary(solc_version)
+    if binary is None:
+        return None
+    cmd = [binary, "--standard-json"]
+    if allow_paths:
+        cmd += ["--allow-paths", allow_paths]
+    proc = subprocess.run(cmd, input=json.dumps(std_input).encode("utf-8"),
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if proc.returncode != 0 or not proc.stdout:
+        raise RuntimeError(f"solc exited with {proc.returncode}: {proc.stderr.decode('utf-8', 'replace').strip()}")
+    result = _json_loads(proc.stdout)
+    errors = [err for err in result.get("errors", []) if err.get("severity") == "error"]
+    if errors:
+        raise RuntimeError(errors[0].get("formattedMessage") or errors[0].get("message"))
+    return result
+
+
+def _compile_standard_json(sources: Dict[str, str], solc_version: str) -> Optional[Dict[str, dict]]:
+    """
+    Compile {name: source} with `solc --standard-json`, requesting only the AST.
+    Returns {name: ast}, or None if the solc binary can't be resolved.
+    """
+    std_input = {
+        "language": "Solidity",
+        "sources": {name: {"content": content} for name, content in sources.items()},
+        "settings": {"outputSelection": {"*": {"": ["ast"]}}},
+    }
+    result = compile_standard_json(std_input, solc_version)
+    if result is None:
+        return None
+    return {name: out["ast"] for name, out in result.get("sources", {}).items() if out.get("ast")}
+
+
+def _compile_ast(source_code: str, solc_version: str) -> Optional[dict]:
+    asts = _compile_standard_json({"source.sol": source_code}, solc_version)
+    if asts is not None:
+        return asts.get("source.sol")
+    # Source is piped to solc on stdin: no temp file to create and remove.
+    # Every '<stdin>:Contract' entry carries the same source-unit AST.
+    result = compile_source(source_code, output_values=["ast"], solc_version=solc_version)
+    for v in result.values():
+        if v.get("ast"):
+            return v["ast"]
+    return None
+
+
+def get_ast_cached(source_code: str, solc_version: str) -> Optional[dict]:
+    """
+    Return the solc AST for source_code, compiling only on a cache miss.
+    Returns None (after printing a warning) if compilation fails; failures are not cached.
+    """
+    if compile_source is None:
+        return None
+    key = hashlib.sha256(source_code.encode("utf-8")).hexdigest()
+    ast = _memory_get(key, solc_version)
+    if ast is not None:
+        return ast
+
+    ast = _load_from_disk(key, solc_version)
+    if ast is None:
+        try:
+            ast = _compile_ast(source_code, solc_version)
+        except Exception as e:
+            print(f"[WARN] AST generation failed: {e}")
+            return None
+        if ast is None:
+            return None
+        _store_on_disk(key, solc_version, ast)
+
+    _memory_put(key, solc_version, ast)
+    return ast
+
+
+def _compile_files_batch(misses: Dict[str, str], solc_version: str) -> Dict[str, dict]:
+    """solcx fallback for the batch compile: {key: source} -> {key + '.sol': ast}."""
+    asts: Dict[str, dict] = {}
+    tmp_dir = tempfile.mkdtemp(prefix="bian_ast_")
+    try:
+        paths = {}
+        for key, source_code in misses.items():
+            path = os.path.join(tmp_dir, f"{key}.sol")
+            with open(path, "w", encoding="utf-8", newline="\n") as f:
+                f.write(source_code)
+            paths[path] = key
+        result = compile_files(list(paths), output_values=["ast"], solc_version=solc_version)
+        for name, output in result.items():
+            key = paths.get(name.rsplit(":", 1)[0])
+            if key and output.get("ast"):
+                asts.setdefault(f"{key}.sol", output["ast"])
+    except Exception as e:
+        print(f"[WARN] Batch AST generation failed, compiling sources one by one: {e}")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return asts
+
+
+def get_asts_cached(sources: List[str], solc_version: str) -> List[Optional[dict]]:
+    """
+    Batch version of get_ast_cached: all cache misses are compiled in a single solc
+    invocation (one process start instead of one per source). If that combined
+    compile fails, e.g. because one source doesn't compile, each miss is retried on
+    its own so the others still get an AST.
+    """
+    if compile_files is None:
+        return [None] * len(sources)
+    keys = [hashlib.sha256(s.encode("utf-8")).hexdigest() for s in sources]
+    # ASTs found for this batch, kept here since a large batch can evict them from
+    # the bounded memory cache before they are returned
+    found: Dict[str, dict] = {}
+    misses: Dict[str, str] = {}
+    for key, source_code in zip(keys, sources):
+        if key in found or key in misses:
+            continue
+        ast = _memory_get(key, solc_version)
+        if ast is None:
+            ast = _load_from_disk(key, solc_version)
+            if ast is not None:
+                _memory_put(key, solc_version, ast)
+        if ast is not None:
+            found[key] = ast
+        else:
+            misses[key] = source_code
+
+    if len(misses) > 1:
+        try:
+            compiled = _compile_standard_json({f"{key}.sol": src for key, src in misses.items()}, solc_version)
+        except Exception as e:
+            print(f"[WARN] Batch AST generation failed, compiling sources one by one: {e}")
+            compiled = {}
+        if compiled is None:
+            compiled = _compile_files_batch(misses, solc_version)
+        for name, ast in compiled.items():
+            key = name[:-len(".sol")]
+            if key not in found:
+                found[key] = ast
+                _memory_put(key, solc_version, ast)
+                _store_on_disk(key, solc_version, ast)
+
+    asts = []
+    for key, source_code in zip(keys, sources):
+        ast = found.get(key)
+        if ast is None and key in misses:
+            ast = get_ast_cached(source_code, solc_version)
+            if ast is not None:
+                found[key] = ast
+        asts.append(ast)
+    return asts
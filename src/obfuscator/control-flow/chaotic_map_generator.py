@@ -3,50 +3,62 @@ Chaotic Map Generator for BiAn-style Opaque Predicates.
 Generates Solidity code for the chaotic map function (CPM) and helper state variables.
 """
 
+import os
 import random
 
+# Helper function body per variant ({name} = helper function name)
+_TEMPLATES = {
+    # Range [20, 119] -> Always > 10
+    # Explicit casts to handle StaticDataObfuscator transforming literals to uint
+    'positive': """
+    function {name}(int256 val) internal pure returns (int256) {{
+        // BiAn Chaotic Map (CPM) - Positive Variant
+        return int256(uint256(keccak256(abi.encodePacked(val)))) % int256(100) + int256(20);
+    }}""",
+    # Range [-150, -51] -> Always < -10
+    'negative': """
+    function {name}(int256 val) internal pure returns (int256) {{
+        // BiAn Chaotic Map (CPM) - Negative Variant
+        return (int256(uint256(keccak256(abi.encodePacked(val)))) % int256(100)) - int256(150);
+    }}""",
+    # Returns an even number: (x % 50) * 2
+    'even': """
+    function {name}(int256 val) internal pure returns (int256) {{
+        // BiAn Chaotic Map (CPM) - Even Variant
+        return (int256(uint256(keccak256(abi.encodePacked(val)))) % int256(50)) * int256(2);
+    }}""",
+}
+
+# Condition per variant that always evaluates to True
+_PREDICATE_TEMPLATES = {
+    'positive': "({name}({var}) > int256(10))",
+    'negative': "({name}({var}) < -int256(10))",
+    'even': "({name}({var}) % int256(2) == int256(0))",
+}
+
 class ChaoticMapGenerator:
     def __init__(self):
-        self.state_var_name = f"cpm_x_{random.randint(1000, 9999)}"
-        self.helper_func_name = f"calculateCPM_{random.randint(1000, 9999)}"
-        self.initial_value = random.randint(12345, 99999)
+        # Per-instance RNG seeded from the OS: no shared module-level random state
+        rng = random.Random(os.urandom(8))
+        self.state_var_name = f"cpm_x_{rng.randint(1000, 9999)}"
+        self.helper_func_name = f"calculateCPM_{rng.randint(1000, 9999)}"
+        self.initial_value = rng.randint(12345, 99999)
         # Randomly select a strategy for diversity
-        self.variant = random.choice(['positive', 'negative', 'even'])
+        self.variant = rng.choice(['positive', 'negative', 'even'])
+        # The generated code never changes for an instance, so build it once
+        self._state_decl = f"    int256 private {self.state_var_name} = int256({self.initial_value});"
+        self._helper_func = _TEMPLATES[self.variant].format(name=self.helper_func_name)
+        self._predicate_cond = _PREDICATE_TEMPLATES[self.variant].format(
+            name=self.helper_func_name, var=self.state_var_name)
 
     def get_state_variable_declaration(self) -> str:
         """Returns the Solidity declaration for the state variable used by CPM."""
-        return f"    int256 private {self.state_var_name} = int256({self.initial_value});"
+        return self._state_decl
 
     def get_helper_function_code(self) -> str:
         """Returns the Solidity code for the CPM helper function based on variant."""
-        if self.variant == 'positive':
-            # Range [20, 119] -> Always > 10
-            # Explicit casts to handle StaticDataObfuscator transforming literals to uint
-            return f"""
-    function {self.helper_func_name}(int256 val) internal pure returns (int256) {{
-        // BiAn Chaotic Map (CPM) - Positive Variant
-        return int256(uint256(keccak256(abi.encodePacked(val)))) % int256(100) + int256(20);
-    }}"""
-        elif self.variant == 'negative':
-            # Range [-150, -51] -> Always < -10
-            return f"""
-    function {self.helper_func_name}(int256 val) internal pure returns (int256) {{
-        // BiAn Chaotic Map (CPM) - Negative Variant
-        return (int256(uint256(keccak256(abi.encodePacked(val)))) % int256(100)) - int256(150);
-    }}"""
-        else: # 'even'
-            # Returns an even number: (x % 50) * 2
-            return f"""
-    function {self.helper_func_name}(int256 val) internal pure returns (int256) {{
-        // BiAn Chaotic Map (CPM) - Even Variant
-        return (int256(uint256(keccak256(abi.encodePacked(val)))) % int256(50)) * int256(2);
-    }}"""
+        return self._helper_func
 
     def get_predicate_condition(self) -> str:
         """Returns the condition string that evaluates to True."""
-        if self.variant == 'positive':
-            return f"({self.helper_func_name}({self.state_var_name}) > int256(10))"
-        elif self.variant == 'negative':
-            return f"({self.helper_func_name}({self.state_var_name}) < -int256(10))"
-        else: # 'even'
-            return f"({self.helper_func_name}({self.state_var_name}) % int256(2) == int256(0))"
+        return self._predicate_cond
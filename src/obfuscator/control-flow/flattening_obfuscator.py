@@ -6,19 +6,96 @@ Flattens the control flow graph by splitting basic blocks and wrapping them in a
 import re
 import os
 import random
-from typing import List, Dict, Optional, Tuple
+import functools
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, List, Dict, Optional, Tuple
+from ast_cache import get_ast_cached, get_asts_cached
 
 try:
-    from solcx import compile_files, install_solc, set_solc_version, get_installed_solc_versions
+    import solcx
+    from solcx import install_solc, set_solc_version, get_installed_solc_versions
 except ImportError:
-    pass
+    solcx = None
+
+# Leading keyword of a type name ("bytes32" -> "bytes", "address payable" -> "address")
+_TYPE_HEAD_RE = re.compile(r'[A-Za-z]*')
+
+@functools.lru_cache(maxsize=1 << 16)
+def _parse_src_cached(src: str) -> Tuple[int, int]:
+    parts = src.split(':')
+    start = int(parts[0])
+    length = int(parts[1])
+    return start, start + length
+
+def _reindent(text: str, indent: str) -> str:
+    """
+    Same result as textwrap.indent(textwrap.dedent(text).strip(), indent), without
+    textwrap's per-call regex passes: strip the common leading spaces/tabs, trim the
+    block and prefix every non-blank line with indent.
+    """
+    lines = text.split('\n')
+    margin = None
+    for line in lines:
+        content = line.lstrip(' \t')
+        if not content:
+            continue
+        ws = line[:len(line) - len(content)]
+        if margin is None:
+            margin = ws
+        elif ws.startswith(margin):
+            continue
+        elif margin.startswith(ws):
+            margin = ws
+        else:
+            for i, (x, y) in enumerate(zip(margin, ws)):
+                if x != y:
+                    margin = margin[:i]
+                    break
+    cut = len(margin) if margin else 0
+    dedented = '\n'.join(line[cut:] if line.lstrip(' \t') else '' for line in lines).strip()
+    return ''.join(indent + line if line.strip() else line for line in dedented.splitlines(True))
+
+# Keys that can lead to a statement, per node type. Both walks below only look for
+# function definitions and loop/if statements, and neither can appear inside an
+# expression, so expression subtrees and leaf statements are not descended into.
+# Node types missing from this table (e.g. from a newer solc) get a full scan.
+_CHILD_KEYS: Dict[str, Tuple[str, ...]] = {
+    'SourceUnit': ('nodes',),
+    'ContractDefinition': ('nodes',),
+    'FunctionDefinition': ('body',),
+    'ModifierDefinition': ('body',),
+    'Block': ('statements',),
+    'UncheckedBlock': ('statements',),
+    'IfStatement': ('trueBody', 'falseBody'),
+    'WhileStatement': ('body',),
+    'DoWhileStatement': ('body',),
+    'ForStatement': ('body',),
+    'TryStatement': ('clauses',),
+    'TryCatchClause': ('block',),
+}
+for _leaf in ('PragmaDirective', 'ImportDirective', 'UsingForDirective', 'VariableDeclaration',
+              'StructDefinition', 'EnumDefinition', 'EventDefinition', 'ErrorDefinition',
+              'UserDefinedValueTypeDefinition', 'ExpressionStatement', 'VariableDeclarationStatement',
+              'Return', 'EmitStatement', 'RevertStatement', 'PlaceholderStatement', 'Break',
+              'Continue', 'InlineAssembly'):
+    _CHILD_KEYS[_leaf] = ()
+del _leaf
 
 class FlatteningObfuscator:
-    def __init__(self, solc_version="0.8.30"):
+    def __init__(self, solc_version="0.8.30", seed: Optional[int] = None):
         self.solc_version = solc_version
+        # A seed makes the block order reproducible; otherwise the global random state is used
+        self._rng = random.Random(seed) if seed is not None else random
+        # Per-source cache of decoded (start, end) slices, reset by flatten_control_flow
+        self._text_cache: Dict[Tuple[int, int], str] = {}
+        self._text_source: Optional[bytes] = None
+        self._text_view: Optional[memoryview] = None
         self._ensure_solc()
 
     def _ensure_solc(self):
+        if solcx is None:
+            print("[WARN] solc setup failed: py-solc-x is not installed")
+            return
         try:
             installed = get_installed_solc_versions()
             if self.solc_version not in installed:
@@ -28,33 +105,14 @@ class FlatteningObfuscator:
             print(f"[WARN] solc setup failed: {e}")
 
     def _get_ast(self, source_code: str) -> Optional[dict]:
-        import tempfile
-        try:
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.sol', delete=False, encoding='utf-8', newline='\n') as tmp:
-                tmp.write(source_code)
-                temp_path = tmp.name
-            
-            result = compile_files([temp_path], output_values=["ast"])
-            for k, v in result.items():
-                if temp_path in k:
-                    return v.get("ast")
-            if len(result) == 1:
-                return list(result.values())[0].get("ast")
-            return None
-        except Exception as e:
-            print(f"[WARN] AST generation failed: {e}")
-            return None
-        finally:
-            if 'temp_path' in locals() and os.path.exists(temp_path):
-                os.remove(temp_path)
+        # Shared with the other passes: identical sources are compiled only once
+        return get_ast_cached(source_code, self.solc_version)
 
     def _parse_src(self, src: str) -> Tuple[int, int]:
-        parts = src.split(':')
-        start = int(parts[0])
-        length = int(parts[1])
-        return start, start + length
+        # The same src strings are parsed over and over (body, statements, conditions)
+        return _parse_src_cached(src)
 
-    def obfuscate(self, source_code: str, ast_path: str = None) -> Tuple[str, int]:
+    def obfuscate(self, source_code: str, ast_path: Optional[str] = None) -> Tuple[str, int]:
         """
         Unified interface for demo.py
         """
@@ -62,22 +120,52 @@ class FlatteningObfuscator:
         count = 1 if new_source != source_code else 0
         return new_source, count
 
-    def flatten_control_flow(self, source_code: str) -> str:
-        ast = self._get_ast(source_code)
+    def flatten_many(self, sources: Dict[str, str], workers: int = 1) -> Dict[str, str]:
+        """
+        Flatten several sources (name -> code) with one solc run for all their ASTs.
+        Returns name -> flattened code; sources without an AST are returned unchanged.
+        With workers > 1 the sources are flattened in a process pool (0 = one per CPU).
+        Each job then gets its own seed drawn from this obfuscator's RNG, so a seeded
+        run is still reproducible, but its output differs from the sequential one.
+        """
+        names = list(sources)
+        asts = get_asts_cached([sources[name] for name in names], self.solc_version)
+        jobs = [(name, ast) for name, ast in zip(names, asts) if ast]
+        results = dict(sources)
+        if workers != 1 and len(jobs) > 1:
+            seeds = [self._rng.getrandbits(64) for _ in jobs]
+            with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker,
+                                     initargs=(self.solc_version,)) as pool:
+                flattened = pool.map(_flatten_in_worker, [sources[name] for name, _ in jobs],
+                                     [ast for _, ast in jobs], seeds)
+                for (name, _), code in zip(jobs, flattened):
+                    results[name] = code
+        else:
+            for name, ast in jobs:
+                results[name] = self.flatten_control_flow(sources[name], ast=ast)
+        return results
+
+    def flatten_control_flow(self, source_code: str, ast: Optional[dict] = None) -> str:
+        if ast is None:
+            ast = self._get_ast(source_code)
         if not ast:
             return source_code
 
         # Encode source for byte-level extraction
         source_bytes = source_code.encode('utf-8')
+        self._text_cache = {}
+        self._text_source = source_bytes
+        self._text_view = memoryview(source_bytes)
         
         # We need to identify FunctionDefinitions that have a body
         functions_to_flatten = []
         self._find_functions(ast, functions_to_flatten)
         
-        # Sort functions reverse by location to modify bottom-up
+        # Sort functions reverse by location (keeps the random block order of
+        # earlier versions for a given seed); edits are stitched together once at the end
         functions_to_flatten.sort(key=lambda x: x['range'][0], reverse=True)
         
-        modified_source = bytearray(source_bytes)
+        edits: List[Tuple[int, int, bytes]] = []
         
         count = 0
         for func in functions_to_flatten:
@@ -94,7 +182,7 @@ class FlatteningObfuscator:
             # Check complexity: do we need flattening?
             # If it's just linear variable decls, maybe skip?
             # User wants to see the structure change. Let's flatten if > 2 statements or has branching.
-            if len(statements) < 2 and not self._has_branching(body_node):
+            if func['stmt_count'] < 2 and not func['has_branching']:
                 continue
                 
             # Extract original body content (excluding braces ideally, or we replace the whole block)
@@ -116,57 +204,93 @@ class FlatteningObfuscator:
             new_block_bytes = flattened_body.encode('utf-8')
             
             start, end = body_range
-            modified_source[start:end] = new_block_bytes
+            edits.append((start, end, new_block_bytes))
             count += 1
             
         print(f"[INFO] Flattened control flow for {count} functions.")
-        return modified_source.decode('utf-8')
+        if not edits:
+            return source_code
+        if all(len(new_block_bytes) == end - start for start, end, new_block_bytes in edits):
+            # Same-size replacements (e.g. re-flattening already flattened code):
+            # overwrite in place, nothing after an edit has to move
+            buf = bytearray(source_bytes)
+            for start, end, new_block_bytes in edits:
+                buf[start:end] = new_block_bytes
+            return buf.decode('utf-8')
+        # Build the output in one pass instead of splicing a bytearray per function
+        edits.reverse()
+        out = []
+        cur = 0
+        for start, end, new_block_bytes in edits:
+            out.append(self._text_view[cur:start])
+            out.append(new_block_bytes)
+            cur = end
+        out.append(self._text_view[cur:])
+        return b''.join(out).decode('utf-8')
 
-    def _find_functions(self, node: dict, results: list):
-        if node.get('nodeType') == 'FunctionDefinition':
-            if node.get('implemented') and node.get('body'):
-                src = node['body'].get('src')
-                if src:
-                    rng = self._parse_src(src)
-                    results.append({'node': node, 'body': node['body'], 'range': rng})
-        
-        # Recurse
-        for key, value in node.items():
-            if isinstance(value, list):
-                for item in value:
-                    if isinstance(item, dict):
-                        self._find_functions(item, results)
-            elif isinstance(value, dict):
-                self._find_functions(value, results)
+    _BRANCH_TYPES = frozenset({'IfStatement', 'WhileStatement', 'ForStatement', 'DoWhileStatement'})
+
+    def _find_functions(self, node: Dict[str, Any], results: List[Dict[str, Any]]) -> None:
+        """
+        Collect implemented functions in a single walk. Each entry carries the body
+        range, its statement count and whether the body contains any branching,
+        so callers don't need to re-walk the body.
+        """
+        branch_types = self._BRANCH_TYPES
+        child_keys = _CHILD_KEYS
+        # Iterative DFS: only dict children are pushed, scalar fields are never visited.
+        # Each entry carries the indices (in results) of the functions whose body encloses it.
+        stack = [(node, ())]
+        while stack:
+            node, owners = stack.pop()
+            node_type = node.get('nodeType')
+            if owners and node_type in branch_types:
+                for owner in owners:
+                    results[owner]['has_branching'] = True
 
-    def _has_branching(self, node: dict) -> bool:
-        # Simple recursive check for If/While/For
-        t = node.get('nodeType', '')
-        if t in ['IfStatement', 'WhileStatement', 'ForStatement', 'DoWhileStatement']:
-            return True
-        for key, value in node.items():
-            if isinstance(value, list):
-                for item in value:
-                    if isinstance(item, dict) and self._has_branching(item):
-                        return True
-            elif isinstance(value, dict) and self._has_branching(value):
-                return True
-        return False
+            body = None
+            if node_type == 'FunctionDefinition':
+                if node.get('implemented') and node.get('body'):
+                    src = node['body'].get('src')
+                    if src:
+                        rng = self._parse_src(src)
+                        body = node['body']
+                        results.append({'node': node, 'body': body, 'range': rng,
+                                        'has_branching': False,
+                                        'stmt_count': len(body.get('statements') or [])})
+            
+            keys = child_keys.get(node_type)
+            values = node.values() if keys is None else [node.get(k) for k in keys]
+            for value in values:
+                if type(value) is dict:
+                    if value is body:
+                        stack.append((value, owners + (len(results) - 1,)))
+                    else:
+                        stack.append((value, owners))
+                elif type(value) is list:
+                    stack.extend([(item, owners) for item in value if type(item) is dict])
 
     def _extract_text(self, node: dict, source_bytes: bytes) -> str:
         src = node.get('src')
         if not src: return ""
         start, end = self._parse_src(src)
-        return source_bytes[start:end].decode('utf-8')
+        if source_bytes is not self._text_source:
+            return source_bytes[start:end].decode('utf-8')
+        key = (start, end)
+        text = self._text_cache.get(key)
+        if text is None:
+            # Decode straight from the memoryview: no intermediate bytes copy
+            text = self._text_cache[key] = str(self._text_view[start:end], 'utf-8')
+        return text
+
+    _DEFAULTS = {'bool': 'false', 'string': '""', 'bytes': '""', 'address': 'address(0)'}
 
     def _get_default_value_for_type(self, type_str: str) -> str:
-        t = type_str.strip()
-        if t.startswith('bool'): return 'false'
-        if t.startswith('string'): return '""'
-        if t.startswith('bytes'): return '""'
-        if t.startswith('address'): return 'address(0)'
+        head = _TYPE_HEAD_RE.match(type_str.strip()).group()
         # For ints/uints or anything else, default to 0
-        return '0'
+        return self._DEFAULTS.get(head, '0')
+
+    _TERMINAL_PREFIXES = frozenset({'return ', 'revert(', 'revert '})
 
     def _create_basic_blocks(self, statements: list, source_bytes: bytes) -> Tuple[List[Dict], List[str]]:
         """
@@ -320,9 +444,8 @@ class FlatteningObfuscator:
         if current_block_content:
             # Check if the block ends with a terminal statement
             last_text = current_block_content[-1]
-            is_terminal = False
-            if last_text.startswith('return ') or last_text.startswith('revert(') or last_text.startswith('revert '):
-                 is_terminal = True
+            # All terminal prefixes are 7 chars long: one slice + set lookup
+            is_terminal = last_text[:7] in self._TERMINAL_PREFIXES
             
             blocks.append({
                 'id': current_id,
@@ -338,28 +461,21 @@ class FlatteningObfuscator:
         """
         Generates dispatcher code with hoisted variables.
         """
-        import textwrap
-        
-        dispatcher = "{\n"
+        # Collected as parts and joined once at the end
+        parts = ["{\n"]
         
         # Inject hoisted variables (Grouped nicely)
         if hoisted_vars:
-            dispatcher += "        // --- Hoisted Local Variables ---\n"
+            parts.append("        // --- Hoisted Local Variables ---\n")
             for var_decl in hoisted_vars:
                  # Already indented when appending
-                dispatcher += f"{var_decl}\n"
-            dispatcher += "        // -------------------------------\n\n"
+                parts.append(f"{var_decl}\n")
+            parts.append("        // -------------------------------\n\n")
             
-        dispatcher += "        uint256 state = 1;\n        while (state != 0) {\n"
+        parts.append("        uint256 state = 1;\n        while (state != 0) {\n")
         
-        # Filter blocks that are actually reachable
-        valid_blocks = [b for b in blocks if b['content'].strip() != ""]
-        if not valid_blocks:
-            valid_blocks = blocks
-            
-        # Shuffle presentation order
-        presentation_blocks = list(blocks)
-        random.shuffle(presentation_blocks)
+        # Shuffle presentation order (one permutation, no copy + in-place shuffle)
+        presentation_blocks = self._rng.sample(blocks, len(blocks))
         
         first = True
         for b in presentation_blocks:
@@ -370,19 +486,31 @@ class FlatteningObfuscator:
             content = b['content']
             next_id = b.get('next')
             
-            block_code = f"            {prefix} (state == {bid}) {{\n"
+            parts.append(f"            {prefix} (state == {bid}) {{\n")
             
             # Smart Indentation: Dedent first to remove common prefix, then indent to dispatcher level
-            dedented = textwrap.dedent(content)
             # We want 16 spaces (4 * 4)
-            indented_content = textwrap.indent(dedented.strip(), "                ")
+            indented_content = _reindent(content, "                ")
             
-            block_code += f"{indented_content}\n"
+            parts.append(f"{indented_content}\n")
             if next_id is not None:
-                block_code += f"                state = {next_id};\n"
-            block_code += "            }\n"
+                parts.append(f"                state = {next_id};\n")
+            parts.append("            }\n")
             
-            dispatcher += block_code
-            
-        dispatcher += "        }\n    }"
-        return dispatcher
+        parts.append("        }\n    }")
+        return ''.join(parts)
+
+
+# Process-pool helpers for flatten_many: one obfuscator per worker process,
+# so solc setup runs once per worker rather than once per source.
+_worker_obfuscator: Optional[FlatteningObfuscator] = None
+
+
+def _init_worker(solc_version: str) -> None:
+    global _worker_obfuscator
+    _worker_obfuscator = FlatteningObfuscator(solc_version)
+
+
+def _flatten_in_worker(source_code: str, ast: dict, seed: int) -> str:
+    _worker_obfuscator._rng = random.Random(seed)
+    return _worker_obfuscator.flatten_control_flow(source_code, ast=ast)
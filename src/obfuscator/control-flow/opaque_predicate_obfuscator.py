@@ -6,8 +6,10 @@ Injects 'always-true' conditions into 'if' and 'while' statements using a Chaoti
 import re
 import os
 import sys
-from typing import Tuple, List, Dict, Optional
+from typing import Any, Tuple, List, Dict, Optional
 from chaotic_map_generator import ChaoticMapGenerator
+from ast_cache import get_ast_cached
+from solidity_lexer import scan_control_ranges
 
 # Try imports similar to boolean_obfuscator.py
 try:
@@ -18,10 +20,16 @@ except Exception:
 
 DEFAULT_SOLC_VERSION = "0.8.30"
 
+_PURE_RE = re.compile(rb'\bpure\b')
+# Header up to the first '{' of the contract body (may span lines)
+_CONTRACT_HEADER_RE = re.compile(r'contract\s+\w+[^{]*\{')
+
 class OpaquePredicateInserter:
-    def __init__(self, solc_version=DEFAULT_SOLC_VERSION):
+    def __init__(self, solc_version=DEFAULT_SOLC_VERSION, use_lexer: bool = True):
         self.cpm_gen = ChaoticMapGenerator()
         self.solc_version = solc_version
+        # Locate conditions with the lightweight scanner first; solc only when it gives up
+        self.use_lexer = use_lexer
 
     def _ensure_solc(self) -> bool:
         if solcx is None:
@@ -37,28 +45,23 @@ class OpaquePredicateInserter:
         except Exception:
             return False
 
-    def _get_ast(self, file_path_param: str = None, source_code: str = None) -> Optional[dict]:
+    def _get_ast(self, file_path_param: Optional[str] = None, source_code: Optional[str] = None) -> Optional[dict]:
         """
         Get AST from file path or source code string using solcx.
-        If source_code is provided, writes to a temp file first.
+        Source strings go through the shared AST cache, so a source another pass
+        already compiled is not compiled again.
         """
         if solcx is None:
             return None
         
         self._ensure_solc()
         
-        temp_path = None
+        if source_code:
+            return get_ast_cached(source_code, self.solc_version)
+
         target_path = file_path_param
 
         try:
-            if source_code:
-                # Create a temp file to compile
-                import tempfile
-                with tempfile.NamedTemporaryFile(mode='w', suffix='.sol', delete=False, encoding='utf-8', newline='\n') as tmp:
-                    tmp.write(source_code)
-                    temp_path = tmp.name
-                    target_path = temp_path
-            
             if not target_path or not os.path.exists(target_path):
                 return None
 
@@ -67,58 +70,56 @@ class OpaquePredicateInserter:
             # Find the AST for the target file
             for k, v in result.items():
                 # k is usually the absolute path
-                if source_code:
-                     if temp_path in k:
-                         return v.get("ast")
-                else:
-                    return v.get("ast")
-            
-            # Fallback if key match fails but only one result
-            if len(result) == 1:
-                return list(result.values())[0].get("ast")
+                return v.get("ast")
                 
             return None
 
         except Exception as e:
             print(f"[WARN] AST generation failed: {e}")
             return None
-        finally:
-            if temp_path and os.path.exists(temp_path):
-                os.remove(temp_path)
 
-    def _find_injection_points(self, ast_node: dict, points: List[Dict]):
+    def _find_injection_points(self, ast_node: Dict[str, Any], points: List[Dict[str, Any]],
+                               pure_ranges: Optional[List[Tuple[int, int]]] = None) -> None:
         """
-        Recursively find 'if' and 'while' statements in the AST.
+        Find 'if' and 'while' statements in the AST (iterative pre-order DFS).
+        If pure_ranges is given, the same walk also collects the byte ranges that
+        spell out a 'pure' mutability: function headers (up to the body) and
+        function type names.
         """
         if not isinstance(ast_node, dict):
             return
 
-        node_type = ast_node.get("nodeType") or ast_node.get("name")
-
-        if node_type == "IfStatement":
-            # In old AST/new AST, structure might differ slightly, but usually has 'condition'
-            condition = ast_node.get("condition")
-            if condition:
-                points.append({
-                    "type": "IfStatement",
-                    "src": condition.get("src")
-                })
-        
-        elif node_type == "WhileStatement":
-            condition = ast_node.get("condition")
-            if condition:
-                points.append({
-                    "type": "WhileStatement",
-                    "src": condition.get("src")
-                })
-        
-        # Recurse
-        for key, value in ast_node.items():
-            if isinstance(value, list):
-                for item in value:
-                    self._find_injection_points(item, points)
-            elif isinstance(value, dict):
-                self._find_injection_points(value, points)
+        stack = [ast_node]
+        while stack:
+            ast_node = stack.pop()
+            node_type = ast_node.get("nodeType") or ast_node.get("name")
+
+            if node_type == "IfStatement" or node_type == "WhileStatement":
+                # In old AST/new AST, structure might differ slightly, but usually has 'condition'
+                condition = ast_node.get("condition")
+                if condition:
+                    points.append({
+                        "type": node_type,
+                        "src": condition.get("src")
+                    })
+
+            elif pure_ranges is not None and ast_node.get("stateMutability") == "pure" and \
+                    node_type in ("FunctionDefinition", "FunctionTypeName"):
+                rng = self._parse_src_to_range(ast_node.get("src") or "")
+                body = ast_node.get("body")
+                body_rng = self._parse_src_to_range(body.get("src") or "") if body else None
+                if rng:
+                    pure_ranges.append((rng[0], body_rng[0] if body_rng else rng[1]))
+
+            # Children are pushed in reverse so they pop in document order
+            children = []
+            for value in ast_node.values():
+                if type(value) is dict:
+                    children.append(value)
+                elif type(value) is list:
+                    children.extend([item for item in value if type(item) is dict])
+            children.reverse()
+            stack.extend(children)
 
     def _parse_src_to_range(self, src_str: str) -> Optional[Tuple[int, int]]:
         try:
@@ -129,7 +130,7 @@ class OpaquePredicateInserter:
         except:
             return None
 
-    def obfuscate(self, source_code: str, ast_path: str = None) -> Tuple[str, int]:
+    def obfuscate(self, source_code: str, ast_path: Optional[str] = None) -> Tuple[str, int]:
         """
         Unified interface for demo.py
         """
@@ -137,38 +138,45 @@ class OpaquePredicateInserter:
         count = 1 if new_source != source_code else 0
         return new_source, count
 
-    def insert_opaque_predicates(self, source_code: str, file_path_hint: str = None) -> str:
+    def insert_opaque_predicates(self, source_code: str, file_path_hint: Optional[str] = None) -> str:
         """
         Injects Opaque Predicates into the source code.
-        1. Parse AST to find If/While conditions.
+        1. Find If/While conditions (token scanner, or the solc AST as fallback).
         2. Inject '&& (calculateCPM(...) > 0)' into conditions.
         3. Inject verify state var and helper function at contract level.
         """
         
-        # 1. Get AST
-        ast = self._get_ast(file_path_param=file_path_hint, source_code=source_code)
-        
-        if not ast:
-            print("[WARN] Could not generate AST for Opaque Predicates. Skipping injection.")
-            return source_code
+        # 1. Fast path: the scanner finds the same ranges without spawning solc
+        scan = scan_control_ranges(source_code) if self.use_lexer else None
+        parsed_points = []
+        if scan is not None:
+            conditions, pure_ranges = scan
+            for start, end, stmt_type in conditions:
+                parsed_points.append({"range": (start, end), "type": stmt_type})
+        else:
+            ast = self._get_ast(file_path_param=file_path_hint, source_code=source_code)
+            
+            if not ast:
+                print("[WARN] Could not generate AST for Opaque Predicates. Skipping injection.")
+                return source_code
+
+            # 2. Find points
+            points = []
+            pure_ranges = []
+            self._find_injection_points(ast, points, pure_ranges)
+            
+            for p in points:
+                src = p["src"]
+                rng = self._parse_src_to_range(src)
+                if rng:
+                    parsed_points.append({"range": rng, "type": p["type"]})
 
-        # 2. Find points
-        points = []
-        self._find_injection_points(ast, points)
-        
-        if not points:
+        if not parsed_points:
             print("[INFO] No suitable branching points found for Opaque Predicates.")
             return source_code
 
-        # 3. Sort points by start index descending to modify safely
-        parsed_points = []
-        for p in points:
-            src = p["src"]
-            rng = self._parse_src_to_range(src)
-            if rng:
-                parsed_points.append({"range": rng, "type": p["type"]})
-        
-        parsed_points.sort(key=lambda x: x["range"][0], reverse=True)
+        # 3. Sort points by start index so edits can be stitched together in order
+        parsed_points.sort(key=lambda x: x["range"][0])
 
         # 4. Perform replacements
         try:
@@ -176,60 +184,61 @@ class OpaquePredicateInserter:
         except:
             source_bytes = bytearray(source_code, 'utf-8')
 
-        cpm_condition = self.cpm_gen.get_predicate_condition()
+        # Conditions are only copied into the output, so work on bytes/memoryview
+        # slices and never decode them
+        view = memoryview(source_bytes)
+        cpm_suffix = f") && {self.cpm_gen.get_predicate_condition()}".encode('utf-8')
+        helper_name = self.cpm_gen.helper_func_name.encode('utf-8')
         
         inserted_count = 0
-        new_bytes = bytearray(source_bytes)
-        
-        # Track which functions (byte ranges) we've touched to remove 'pure' later
-        # But wait, simply doing a global replace of "pure" -> "view" in the whole file is risky?
-        # Better: identify the function scope from AST and remove 'pure' locally.
-        
-        # Simpler approach: 
-        # Since we use regex for function signature modification or just simple string replacement
-        # Let's perform the condition replacement first.
+        # (start, end, replacement) edits, applied together in one pass at the end
+        edits: List[Tuple[int, int, bytes]] = []
+        cur = 0
         
         for p in parsed_points:
             start, end = p["range"]
             
-            if start < 0 or end > len(source_bytes):
+            if start < cur or end > len(source_bytes):
+                # out of range, or overlapping a condition already rewritten
                 continue
                 
-            original_cond_bytes = source_bytes[start:end]
-            original_cond_str = original_cond_bytes.decode('utf-8')
-            
-            if self.cpm_gen.helper_func_name in original_cond_str:
+            if source_bytes.find(helper_name, start, end) != -1:
                 continue
 
-            new_cond_str = f"({original_cond_str}) && {cpm_condition}"
-            new_cond_bytes = new_cond_str.encode('utf-8')
-            new_bytes[start:end] = new_cond_bytes
+            new_cond_bytes = b''.join((b'(', view[start:end], cpm_suffix))
+            edits.append((start, end, new_cond_bytes))
+            cur = end
             inserted_count += 1
 
-        source_code_mod = new_bytes.decode('utf-8')
-
         if inserted_count == 0:
             return source_code
 
         # 5. Handle 'pure' -> 'view'
         # BiAn paper mentions "remove obvious dependencies". 
-        # Here we just strictly need to fix compilation.
-        # Quick fix: replace " pure " with " view " or " " in functions that contain the CPM helper call?
-        # Or just universally replace " pure " -> " view " in the contract? 
-        # That's safe for compilation (view > pure).
-        # We'll use regex to perform safe replacement of 'pure' keyword in function signatures.
-        # Be careful not to replace strings or comments containing 'pure'.
-        
-        # Regex to find 'function ... (...) ... pure ...'
-        # This is complex to match exactly only modified functions.
-        # GLOBAL STRATEGY: Replace ' pure ' with ' view ' everywhere.
-        # Pros: Guarantees no 'pure' error. Cons: Might change non-target functions. 
-        # Acceptable for obfuscation context.
-        
-        source_code_mod = re.sub(r'\bpure\b', 'view', source_code_mod)
+        # Here we just strictly need to fix compilation: the predicates read the CPM
+        # state variable, so every pure function becomes view (safe for compilation,
+        # view > pure). Only the 'pure' keywords the AST walk located in function
+        # headers and function types are rewritten, so strings/comments stay intact.
+        for hdr_start, hdr_end in pure_ranges:
+            for m in _PURE_RE.finditer(source_bytes, hdr_start, hdr_end):
+                edits.append((m.start(), m.end(), b'view'))
+        edits.sort(key=lambda e: e[0])
+
+        out = []
+        cur = 0
+        for start, end, new_bytes in edits:
+            # A function type nested in a pure header is found by both ranges; the
+            # same 'pure' must only be replaced once
+            if start < cur:
+                continue
+            out.append(view[cur:start])
+            out.append(new_bytes)
+            cur = end
+        out.append(view[cur:])
+        source_code_mod = b''.join(out).decode('utf-8')
 
         # 6. Inject Helper Function and State Variable
-        match = re.search(r'contract\s+\w+.*\{', source_code_mod)
+        match = _CONTRACT_HEADER_RE.search(source_code_mod)
         if match:
             insert_pos = match.end()
             components = f"\n{self.cpm_gen.get_state_variable_declaration()}\n{self.cpm_gen.get_helper_function_code()}\n"
@@ -3,67 +3,93 @@ Pre-processing Obfuscator for BiAn-style Obfuscation.
 Handles:
 1. Modifier Inlining: "Unrolls" modifiers into function bodies.
 2. Internal Function Inlining: Replaces internal function calls with their body logic.
+Once solc output is cached, the remaining cost is the AST walk (_walk) and the edit
+assembly (_apply_edits).
 """
 
 import re
-import os
-from typing import List, Dict, Optional, Tuple
+import functools
+from bisect import bisect_left
+from collections import deque
+from typing import Any, Callable, Deque, List, Dict, Optional, Tuple
+from ast_cache import get_ast_cached
 
 try:
-    from solcx import compile_files, install_solc, set_solc_version, get_installed_solc_versions
+    import solcx
+    from solcx import install_solc, set_solc_version, get_installed_solc_versions
 except ImportError:
-    pass
+    solcx = None
 
 DEFAULT_SOLC_VERSION = "0.8.30"
 
+# Cheap pre-checks before asking solc for an AST. They may match too much (comments,
+# strings) but never too little: a local modifier needs the 'modifier' keyword, and
+# only functions declared 'pure' or 'view' are inlined. 'internal' is not required,
+# since free functions are internal without saying so.
+_HAS_MODIFIER = re.compile(r'\bmodifier\s+\w+')
+_HAS_PURE_OR_VIEW = re.compile(r'\b(?:pure|view)\b')
+
+@functools.lru_cache(maxsize=1 << 16)
+def _parse_src_cached(src: str) -> Tuple[int, int]:
+    # "start:length:file" -> (start, end); the src string identifies the range, so
+    # every node sharing it is parsed once
+    parts = src.split(':')
+    start = int(parts[0])
+    length = int(parts[1])
+    return start, start + length
+
+@functools.lru_cache(maxsize=8)
+def _setup_solc(solc_version: str) -> None:
+    # Install/select once per process: the version probe and install check are not
+    # repeated for every PreprocessingObfuscator (e.g. one per contract in a batch)
+    installed = get_installed_solc_versions()
+    if solc_version not in installed:
+        install_solc(solc_version)
+    set_solc_version(solc_version)
+
 class PreprocessingObfuscator:
     def __init__(self, solc_version="0.8.30"):
         self.solc_version = solc_version
+        # (ast, index) of the last whole-AST walk, shared by both inlining passes
+        self._index_cache: Optional[Tuple[dict, Dict[str, List[dict]]]] = None
+        # ModifierDefinition id -> its '_;' statement (None if missing), for the same AST
+        self._placeholders: Dict[int, Optional[dict]] = {}
         self._ensure_solc()
 
     def _ensure_solc(self):
+        if solcx is None:
+            print("[WARN] solc setup failed: py-solc-x is not installed")
+            return
         try:
-            installed = get_installed_solc_versions()
-            if self.solc_version not in installed:
-                install_solc(self.solc_version)
-            set_solc_version(self.solc_version)
+            _setup_solc(self.solc_version)
         except Exception as e:
             print(f"[WARN] solc setup failed: {e}")
 
     def _get_ast(self, source_code: str) -> Optional[dict]:
-        import tempfile
-        try:
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.sol', delete=False, encoding='utf-8', newline='\n') as tmp:
-                tmp.write(source_code)
-                temp_path = tmp.name
-            
-            result = compile_files([temp_path], output_values=["ast"])
-            for k, v in result.items():
-                if temp_path in k:
-                    return v.get("ast")
-            if len(result) == 1:
-                return list(result.values())[0].get("ast")
-            return None
-        except Exception as e:
-            print(f"[WARN] AST generation failed: {e}")
-            return None
-        finally:
-            if 'temp_path' in locals() and os.path.exists(temp_path):
-                os.remove(temp_path)
+        # Source goes to solc in memory (no temp file) through the AST cache shared
+        # with the other control-flow passes. When inline_modifiers changes nothing,
+        # inline_functions asks for the same source and gets a cache hit.
+        return get_ast_cached(source_code, self.solc_version)
 
     def _parse_src(self, src: str) -> Tuple[int, int]:
-        parts = src.split(':')
-        start = int(parts[0])
-        length = int(parts[1])
-        return start, start + length
+        # Function, body and call src strings are parsed by several steps
+        return _parse_src_cached(src)
 
     def _extract_text(self, node: dict, source_bytes: bytes) -> str:
         src = node.get('src')
         if not src: return ""
         start, end = self._parse_src(src)
-        return source_bytes[start:end].decode('utf-8')
+        # Decode straight from the buffer, no intermediate bytes copy
+        return str(memoryview(source_bytes)[start:end], 'utf-8')
+
+    def _extract_bytes(self, node: dict, source_view: memoryview) -> bytes:
+        # Raw UTF-8 bytes of a node; decoding is left to whoever emits the final source
+        src = node.get('src')
+        if not src: return b""
+        start, end = self._parse_src(src)
+        return source_view[start:end].tobytes()
 
-    def obfuscate(self, source_code: str, ast_path: str = None) -> Tuple[str, int]:
+    def obfuscate(self, source_code: str, ast_path: Optional[str] = None) -> Tuple[str, int]:
         """
         Unified interface for demo.py
         Returns: (obfuscated_source, change_count)
@@ -76,42 +102,59 @@ class PreprocessingObfuscator:
 
     def apply_preprocessing(self, source_code: str) -> str:
         """
-        Applies both modifier inlining and function inlining.
-        Does multiple passes if necessary or sequential.
+        Applies both modifier inlining and function inlining from a single AST.
+        Call sites are inlined first as edits on the original source; modifier inlining
+        then copies the already-rewritten text into the function bodies. Functions that
+        get a modifier inlined are never call-inlining targets, so their modifier checks
+        stay in place; no second solc run is needed.
         """
-        # Pass 1: Modifier Inlining
-        source_code = self.inline_modifiers(source_code)
-        
-        # Pass 2: Internal Function Inlining
-        # We might need to regenerate AST between passes if structure changes significantly,
-        # but for simple text replacements we might get away with one pass if non-overlapping.
-        # However, modifier inlining changes function bodies, so internal calls inside modifiers
-        # (or inside the main body) might shift positions.
-        # SAFEST approach: Regenerate AST or use an offset tracker. 
-        # For this demo, let's just re-parse AST inside each method for simplicity/robustness.
+        has_modifier = _HAS_MODIFIER.search(source_code) is not None
+        has_pure_or_view = _HAS_PURE_OR_VIEW.search(source_code) is not None
+        if not has_modifier and not has_pure_or_view:
+            return source_code
+        ast = self._get_ast(source_code)
+        if not ast: return source_code
         
-        source_code = self.inline_functions(source_code)
+        source_bytes = source_code.encode('utf-8')
+        # Pass 2 edits are computed first: pass 1 reads source ranges through them
+        func_edits = self._function_edits(source_bytes, ast) if has_pure_or_view else []
+        # Pass 1: Modifier Inlining
+        mod_edits = self._modifier_edits(source_bytes, ast, func_edits) if has_modifier else []
         
-        return source_code
+        # Modifier edits go first so that on a tie they win; call edits inside a
+        # rewritten span are already applied within it and get skipped as overlaps
+        return self._apply_edits(source_bytes, mod_edits + func_edits)
 
     def inline_modifiers(self, source_code: str) -> str:
+        if not _HAS_MODIFIER.search(source_code): return source_code
         ast = self._get_ast(source_code)
         if not ast: return source_code
         
         source_bytes = source_code.encode('utf-8')
-        modified_source = bytearray(source_bytes)
+        return self._apply_edits(source_bytes, self._modifier_edits(source_bytes, ast))
+
+    def _modifier_edits(self, source_bytes: bytes, ast: dict,
+                        inner_edits: Optional[List[Tuple[int, int, bytes]]] = None) -> List[Tuple[int, int, bytes]]:
+        # (start, end, replacement) spans on source_bytes, applied in one forward pass by the caller
+        edits: List[Tuple[int, int, bytes]] = []
+        
+        index = self._index_ast(ast)
         
         # 1. Collect all ModifierDefinitions for lookup
-        modifiers_db = {}
-        self._collect_nodes(ast, 'ModifierDefinition', modifiers_db)
+        modifiers_db = {node['id']: node for node in index['ModifierDefinition']}
         
         # 2. Collect all FunctionDefinitions that have modifiers
-        functions_to_process = []
-        self._collect_functions_with_modifiers(ast, functions_to_process)
+        functions_to_process = [{'node': node} for node in index['FunctionDefinition'] if node.get('modifiers')]
         
         # 3. Sort functions reverse by src to handle bottom-up replacement
         functions_to_process.sort(key=lambda x: self._parse_src(x['node']['src'])[0], reverse=True)
         
+        # Source ranges copied into the new bodies are read with inner_edits applied
+        read_range = self._range_reader(source_bytes, inner_edits)
+        
+        # Modifier id -> cleaned (pre, post) code, or None if it can't be inlined
+        mod_slices: Dict[int, Optional[Tuple[bytes, bytes]]] = {}
+        
         for item in functions_to_process:
             func_node = item['node']
             func_src = self._parse_src(func_node['src'])
@@ -123,9 +166,12 @@ class PreprocessingObfuscator:
             body_start, body_end = self._parse_src(func_body_node['src'])
             # The body src includes braces { }. We want content inside.
             # Assuming standard formatting, but AST gives exact range.
-            original_body_content = source_bytes[body_start+1 : body_end-1].decode('utf-8')
+            original_body_content = read_range(body_start+1, body_end-1)
             
-            current_body = original_body_content
+            # Wrapping code around the body, outermost modifier first / last. Each
+            # modifier adds segments once instead of re-copying the growing body.
+            pre_segments: Deque[bytes] = deque()
+            post_segments: List[bytes] = []
             
             # Process modifiers in REVERSE order of application (e.g. mod1 mod2 -> mod2(body) -> mod1(result))
             # In AST, 'modifiers' list is [mod1, mod2].
@@ -148,103 +194,186 @@ class PreprocessingObfuscator:
                 # We found a local modifier definition
                 modifiers_to_remove_from_sig.append(mod_invocation)
                 
-                # Extract modifier wrapper logic
-                mod_body_node = mod_def.get('body')
-                if not mod_body_node: continue
-                
-                # Find the `_;` placeholder statement
-                placeholder = self._find_placeholder(mod_body_node)
-                if not placeholder:
-                    print(f"[WARN] Modifier {mod_name} has no '_;' placeholder. Skipping.")
-                    continue
-                    
-                # Extract Pre and Post parts
-                mod_body_start, mod_body_end = self._parse_src(mod_body_node['src'])
-                placeholder_start, placeholder_end = self._parse_src(placeholder['src'])
-                
-                # Safety check
-                if placeholder_start < mod_body_start or placeholder_end > mod_body_end:
-                    continue
-                    
-                # Pre: from start+1 (skip {) to placeholder start
-                pre_code = source_bytes[mod_body_start+1 : placeholder_start].decode('utf-8')
-                # Post: from placeholder end to end-1 (skip })
-                post_code = source_bytes[placeholder_end : mod_body_end-1].decode('utf-8')
-                
-                # Cleanup: If placeholder 'src' only covered '_', post_code might start with ';'.
-                # We want to remove that stray semicolon because it's part of the placeholder statement syntax logic which is gone.
-                if post_code.strip().startswith(';'):
-                    # precise removal: find the first ';' and remove everything up to it?
-                    # simpler: just strip leading whitespace, then check ';'
-                    stripped = post_code.lstrip()
-                    if stripped.startswith(';'):
-                        # Calculate how much was stripped (whitespace) + 1 char
-                        idx = post_code.find(';')
-                        post_code = post_code[idx+1:]
-                
-                # TODO: Argument Substitution if modifier has parameters
-                # MVP: Simple substitution if no args or simple args.
-                # User example has no args. We will implement simple replace.
+                # Pre/post code is the same for every function using this modifier
+                if ref_id not in mod_slices:
+                    mod_slices[ref_id] = self._extract_modifier_parts(mod_def, mod_name, read_range)
+                parts = mod_slices[ref_id]
+                if parts is None: continue
+                pre_code_clean, post_code_clean = parts
                 
                 # Combine: Pre + CurrentBody + Post
-                # Clean up extracted parts to avoid excessive newlines
-                pre_code_clean = pre_code.rstrip()
-                post_code_clean = post_code.lstrip()
-                if post_code_clean.startswith(';'): # Safety check for stray semicolon again
-                     post_code_clean = post_code_clean[1:]
-                
                 # We construct the body carefully
-                current_body = f"\n        // Inline Modifier: {mod_name}\n{pre_code_clean}\n{current_body}\n{post_code_clean}"
+                # Everything stays UTF-8 bytes: nothing is decoded or re-encoded per edit
+                pre_segments.extendleft((b"\n", pre_code_clean, b"\n",
+                                         mod_name.encode('utf-8'), b"\n        // Inline Modifier: "))
+                post_segments.append(b"\n")
+                post_segments.append(post_code_clean)
             
             # 4. Apply changes to Source
             
             # 4a. Update Body
-            new_body_block = f"{{ {current_body} }}"
+            new_body_block = b''.join((b"{ ", *pre_segments, original_body_content, *post_segments, b" }"))
             
-            modified_source[body_start:body_end] = new_body_block.encode('utf-8')
+            edits.append((body_start, body_end, new_body_block))
             
             # 4b. Remove Modifier from Signature
-            modifiers_to_remove_from_sig.sort(key=lambda x: self._parse_src(x['src'])[0], reverse=True)
-            
             for mod_inv in modifiers_to_remove_from_sig:
                 m_start, m_end = self._parse_src(mod_inv['src'])
                 
                 # Try to remove ONE preceding space if present
-                if m_start > 0 and modified_source[m_start-1] == 32: # space in ascii
+                if m_start > 0 and source_bytes[m_start-1] == 32: # space in ascii
                     m_start -= 1
                 
-                modified_source[m_start:m_end] = b""
+                edits.append((m_start, m_end, b""))
                 
-        return modified_source.decode('utf-8')
-
+        return edits
 
-    def _collect_nodes(self, node: dict, target_type: str, result_map: dict):
-        if node.get('nodeType') == target_type:
-            result_map[node['id']] = node
+    def _extract_modifier_parts(self, mod_def: dict, mod_name: str,
+                                read_range: Callable[[int, int], bytes]) -> Optional[Tuple[bytes, bytes]]:
+        """
+        Return the cleaned (pre, post) code bytes around a modifier's '_;' placeholder,
+        or None if the modifier can't be inlined.
+        """
+        if not self._modifier_is_inlinable(mod_def):
+            if mod_def.get('body') and not self._placeholders.get(mod_def['id']):
+                print(f"[WARN] Modifier {mod_name} has no '_;' placeholder. Skipping.")
+            return None
+            
+        # Extract Pre and Post parts
+        mod_body_start, mod_body_end = self._parse_src(mod_def['body']['src'])
+        placeholder_start, placeholder_end = self._parse_src(self._placeholders[mod_def['id']]['src'])
+            
+        # Pre: from start+1 (skip {) to placeholder start
+        pre_code = read_range(mod_body_start+1, placeholder_start)
+        # Post: from placeholder end to end-1 (skip })
+        post_code = read_range(placeholder_end, mod_body_end-1)
+        
+        # Cleanup: If placeholder 'src' only covered '_', post_code might start with ';'.
+        # We want to remove that stray semicolon because it's part of the placeholder statement syntax logic which is gone.
+        if post_code.strip().startswith(b';'):
+            # precise removal: find the first ';' and remove everything up to it?
+            # simpler: just strip leading whitespace, then check ';'
+            stripped = post_code.lstrip()
+            if stripped.startswith(b';'):
+                # Calculate how much was stripped (whitespace) + 1 char
+                idx = post_code.find(b';')
+                post_code = post_code[idx+1:]
+        
+        # TODO: Argument Substitution if modifier has parameters
+        # MVP: Simple substitution if no args or simple args.
+        # User example has no args. We will implement simple replace.
         
-        for key, value in node.items():
-            if isinstance(value, list):
-                for item in value:
-                    if isinstance(item, dict):
-                        self._collect_nodes(item, target_type, result_map)
-            elif isinstance(value, dict):
-                self._collect_nodes(value, target_type, result_map)
+        # Clean up extracted parts to avoid excessive newlines
+        pre_code_clean = pre_code.rstrip()
+        post_code_clean = post_code.lstrip()
+        if post_code_clean.startswith(b';'): # Safety check for stray semicolon again
+             post_code_clean = post_code_clean[1:]
+        return pre_code_clean, post_code_clean
+
+    def _modifier_is_inlinable(self, mod_def: dict) -> bool:
+        # Whether _extract_modifier_parts yields code for this modifier: it needs a body
+        # with a '_;' placeholder inside it
+        mod_body_node = mod_def.get('body')
+        placeholder = self._placeholders.get(mod_def['id'])
+        if not mod_body_node or not placeholder:
+            return False
+        mod_body_start, mod_body_end = self._parse_src(mod_body_node['src'])
+        placeholder_start, placeholder_end = self._parse_src(placeholder['src'])
+        return mod_body_start <= placeholder_start and placeholder_end <= mod_body_end
+
+    def _has_inlined_modifier(self, func: dict, modifiers_db: Dict[int, dict]) -> bool:
+        for mod_invocation in func.get('modifiers') or []:
+            mod_def = modifiers_db.get(mod_invocation['modifierName'].get('referencedDeclaration'))
+            if mod_def and self._modifier_is_inlinable(mod_def):
+                return True
+        return False
 
-    def _collect_functions_with_modifiers(self, node: dict, results: list):
-        if node.get('nodeType') == 'FunctionDefinition':
-            if node.get('modifiers'): # If has modifiers
-                 results.append({'node': node})
+    def _range_reader(self, source_bytes: bytes,
+                      edits: Optional[List[Tuple[int, int, bytes]]]) -> Callable[[int, int], bytes]:
+        """
+        Return read_range(start, end): the bytes of source_bytes[start:end] with the
+        edits lying entirely inside that range applied (overlapping ones skipped).
+        """
+        if not edits:
+            return lambda start, end: source_bytes[start:end]
+        edits = sorted(edits, key=lambda x: x[0])
+        starts = [edit[0] for edit in edits]
+        view = memoryview(source_bytes)
         
-        for key, value in node.items():
-            if isinstance(value, list):
-                for item in value:
-                    if isinstance(item, dict):
-                        self._collect_functions_with_modifiers(item, results)
-            elif isinstance(value, dict):
-                self._collect_functions_with_modifiers(value, results)
-                
+        def read_range(start: int, end: int) -> bytes:
+            segments: List[Any] = []
+            cursor = start
+            for i in range(bisect_left(starts, start), len(edits)):
+                e_start, e_end, new_bytes = edits[i]
+                if e_start >= end:
+                    break
+                if e_start < cursor or e_end > end:
+                    continue
+                segments.append(view[cursor:e_start])
+                segments.append(new_bytes)
+                cursor = e_end
+            segments.append(view[cursor:end])
+            return b''.join(segments)
+        return read_range
+
+    def _apply_edits(self, source_bytes: bytes, edits: List[Tuple[int, int, bytes]]) -> str:
+        """
+        Apply (start, end, replacement) edits in a single forward pass: unmodified spans
+        (zero-copy memoryview slices) and replacements are collected as segments and
+        joined once, so no tail is ever shifted. An edit overlapping an earlier one is skipped.
+        """
+        if not edits:
+            return source_bytes.decode('utf-8')
+        edits.sort(key=lambda x: x[0])
+        view = memoryview(source_bytes)
+        segments: List[Any] = []
+        cursor = 0
+        for start, end, new_bytes in edits:
+            if start < cursor:
+                continue
+            segments.append(view[cursor:start])
+            segments.append(new_bytes)
+            cursor = end
+        segments.append(view[cursor:])
+        return b''.join(segments).decode('utf-8')
+
+
+    _INDEXED_TYPES = ('ModifierDefinition', 'FunctionDefinition', 'FunctionCall')
+
+    def _index_ast(self, ast: dict) -> Dict[str, List[dict]]:
+        # One walk collects everything both inlining passes look up; reused while the AST is the same
+        if self._index_cache is None or self._index_cache[0] is not ast:
+            index = self._walk(ast, self._INDEXED_TYPES)
+            self._index_cache = (ast, index)
+            self._placeholders = {mod['id']: self._find_placeholder(mod['body']) if mod.get('body') else None
+                                  for mod in index['ModifierDefinition']}
+        return self._index_cache[1]
+
+    def _walk(self, root: dict, node_types: Tuple[str, ...]) -> Dict[str, List[dict]]:
+        """
+        Iterative pre-order walk: returns nodeType -> nodes (in source order of the
+        tree) for each of node_types.
+        """
+        found: Dict[str, List[dict]] = {t: [] for t in node_types}
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            bucket = found.get(node.get('nodeType'))
+            if bucket is not None:
+                bucket.append(node)
+            children: List[dict] = []
+            for value in node.values():
+                if isinstance(value, list):
+                    children.extend(item for item in value if isinstance(item, dict))
+                elif isinstance(value, dict):
+                    children.append(value)
+            # reversed, so the first child is popped (visited) first
+            children.reverse()
+            stack.extend(children)
+        return found
+
     def _find_placeholder(self, block_node: dict) -> Optional[dict]:
-        # BFS/DFS to find PlaceholderStatement ('_')
+        # BFS/DFS to find PlaceholderStatement ('_'); run once per modifier by _index_ast
         statements = block_node.get('statements', [])
         for stmt in statements:
             if stmt.get('nodeType') == 'PlaceholderStatement':
@@ -253,19 +382,31 @@ class PreprocessingObfuscator:
 
 
     def inline_functions(self, source_code: str) -> str:
+        if not _HAS_PURE_OR_VIEW.search(source_code): return source_code
         ast = self._get_ast(source_code)
         if not ast: return source_code
         
         source_bytes = source_code.encode('utf-8')
-        modified_source = bytearray(source_bytes)
+        # A call nested in another call's arguments overlaps the outer edit and is
+        # skipped: the outer inlined text already carries the original argument text
+        return self._apply_edits(source_bytes, self._function_edits(source_bytes, ast))
+
+    def _function_edits(self, source_bytes: bytes, ast: dict) -> List[Tuple[int, int, bytes]]:
+        source_view = memoryview(source_bytes)
+        edits: List[Tuple[int, int, bytes]] = []
         
         # 1. Collect Internal Functions (Definitions)
         # MVP: Only inline 'pure/view' functions with a single 'return' statement.
-        internal_funcs = {}
-        self._collect_nodes(ast, 'FunctionDefinition', internal_funcs)
+        index = self._index_ast(ast)
+        internal_funcs = {node['id']: node for node in index['FunctionDefinition']}
+        modifiers_db = {node['id']: node for node in index['ModifierDefinition']}
         
         target_funcs = {}
         for fid, func in internal_funcs.items():
+            # Inlining call sites of a function that gets a modifier inlined would
+            # silently drop the modifier's checks
+            if self._has_inlined_modifier(func, modifiers_db):
+                continue
             if func.get('visibility') == 'internal' and func.get('stateMutability') in ['pure', 'view']:
                 # Check body: single return statement?
                 body = func.get('body')
@@ -275,8 +416,14 @@ class PreprocessingObfuscator:
                          target_funcs[fid] = func
                          
         # 2. Find Call Sites
-        call_sites = []
-        self._collect_call_sites(ast, call_sites, target_funcs)
+        call_sites: List[Dict[str, Any]] = []
+        for node in index['FunctionCall']:
+            # Check expression -> referencedDeclaration
+            expr = node.get('expression')
+            if expr:
+                ref_id = expr.get('referencedDeclaration')
+                if ref_id in target_funcs:
+                    call_sites.append({'node': node, 'target_id': ref_id})
         
         # 3. Sort reverse by location
         call_sites.sort(key=lambda x: self._parse_src(x['node']['src'])[0], reverse=True)
@@ -299,7 +446,7 @@ class PreprocessingObfuscator:
             for i, param in enumerate(params):
                 p_name = param['name']
                 # Extract argument text
-                arg_text = self._extract_text(args[i], source_bytes)
+                arg_text = self._extract_bytes(args[i], source_view)
                 
                 # Check if arg_text is simple (Identifier or Literal Number)
                 # Regex for simple var or number: ^[\w]+$ (alphanumeric + underscore)
@@ -313,7 +460,7 @@ class PreprocessingObfuscator:
                     param_map[p_name] = arg_text
                 else:
                     # MVP: Always wrap complex exprs in parens for safety: (arg)
-                    param_map[p_name] = f"({arg_text})"
+                    param_map[p_name] = b"(" + arg_text + b")"
                 
             # Extract Body Expression
             # body statements[0] is Return. return expressions/expression.
@@ -328,11 +475,11 @@ class PreprocessingObfuscator:
             
             # Get expression text range
             expr_start, expr_end = self._parse_src(ret_expr['src'])
-            expr_text = source_bytes[expr_start:expr_end].decode('utf-8')
+            # Kept as bytes: the identifier offsets below are byte offsets
+            expr_text = source_view[expr_start:expr_end].tobytes()
             
             # Find all Identifiers in the return expression that refer to params
-            identifiers = []
-            self._collect_identifiers(ret_expr, identifiers)
+            identifiers = self._walk(ret_expr, ('Identifier',))['Identifier']
             
             # Filter identifiers that are strictly parameters (scoped to function)
             # Actually, just matching name might be risky if shadowed, 
@@ -341,7 +488,7 @@ class PreprocessingObfuscator:
             
             param_ids = {p['id']: p['name'] for p in params}
             
-            replacements = [] # (start, end, new_text) relative to expression start
+            replacements: List[Tuple[int, int, bytes]] = [] # (start, end, new_text) relative to expression start
             
             for ident in identifiers:
                 ref_id = ident.get('referencedDeclaration')
@@ -357,48 +504,22 @@ class PreprocessingObfuscator:
                     
                     replacements.append((rel_start, rel_end, new_val))
                     
-            # Apply replacements to expression text (reverse order)
-            replacements.sort(key=lambda x: x[0], reverse=True)
+            # Apply replacements to expression text in one forward pass
+            # (identifiers are leaves, so replacements never overlap)
+            replacements.sort(key=lambda x: x[0])
             
-            # If complex expression, we should convert expr_text to bytearray or list
-            # Or just slice strings.
-            inlined_expr = expr_text
+            segments: List[bytes] = []
+            cursor = 0
             for start, end, new_val in replacements:
-                inlined_expr = inlined_expr[:start] + new_val + inlined_expr[end:]
+                segments.append(expr_text[cursor:start])
+                segments.append(new_val)
+                cursor = end
+            segments.append(expr_text[cursor:])
+            inlined_expr = b''.join(segments)
                 
             # Now replace the Call Site with inlined_expr
             call_start, call_end = self._parse_src(call_node['src'])
             
-            # Update source (in place)
-            modified_source[call_start:call_end] = inlined_expr.encode('utf-8')
-            
-        return modified_source.decode('utf-8')
-
-    def _collect_call_sites(self, node: dict, results: list, target_funcs: dict):
-        if node.get('nodeType') == 'FunctionCall':
-            # Check expression -> referencedDeclaration
-            expr = node.get('expression')
-            if expr:
-                ref_id = expr.get('referencedDeclaration')
-                if ref_id in target_funcs:
-                     results.append({'node': node, 'target_id': ref_id})
-                     
-        for key, value in node.items():
-            if isinstance(value, list):
-                for item in value:
-                    if isinstance(item, dict):
-                        self._collect_call_sites(item, results, target_funcs)
-            elif isinstance(value, dict):
-                self._collect_call_sites(value, results, target_funcs)
-
-    def _collect_identifiers(self, node: dict, results: list):
-        if node.get('nodeType') == 'Identifier':
-            results.append(node)
+            edits.append((call_start, call_end, inlined_expr))
             
-        for key, value in node.items():
-            if isinstance(value, list):
-                for item in value:
-                    if isinstance(item, dict):
-                        self._collect_identifiers(item, results)
-            elif isinstance(value, dict):
-                self._collect_identifiers(value, results)
+        return edits
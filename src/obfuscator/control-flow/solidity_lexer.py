@@ -0,0 +1,100 @@
+"""
+Lightweight Solidity scanner for passes that only need byte ranges.
+Finds 'if'/'while' condition ranges and 'pure' keywords without running solc.
+Strings, comments and nesting are handled; anything it can't classify with
+certainty (inline assembly, unbalanced brackets, unterminated literals) makes it
+return None so the caller falls back to the solc AST.
+"""
+
+import functools
+import re
+from typing import List, Optional, Tuple
+
+_TOKEN_RE = re.compile(rb"""
+    (?P<ws>\s+)
+  | (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<string>"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')
+  | (?P<ident>[A-Za-z_$][A-Za-z0-9_$]*)
+  | (?P<number>[0-9][0-9A-Za-z_.]*)
+  | (?P<punct>.)
+""", re.VERBOSE | re.DOTALL)
+
+_OPEN = {b'(': b')', b'[': b']', b'{': b'}'}
+_CLOSE = {b')', b']', b'}'}
+
+# (start, end, statement type) of each condition, and (start, end) of each 'pure'
+ScanResult = Tuple[List[Tuple[int, int, str]], List[Tuple[int, int]]]
+
+
+def _tokenize(source_bytes: bytes) -> Optional[List[Tuple[str, int, int, bytes]]]:
+    """Significant tokens as (kind, start, end, text); None on anything unexpected."""
+    tokens = []
+    for m in _TOKEN_RE.finditer(source_bytes):
+        kind = m.lastgroup
+        if kind == 'ws' or kind == 'comment':
+            continue
+        text = m.group()
+        if kind == 'punct' and text in (b'"', b"'"):
+            # unterminated string literal
+            return None
+        if kind == 'ident' and text == b'assembly':
+            # Yul has its own 'if' syntax; leave those sources to the AST
+            return None
+        tokens.append((kind, m.start(), m.end(), text))
+    return tokens
+
+
+@functools.lru_cache(maxsize=32)
+def scan_control_ranges(source_code: str) -> Optional[ScanResult]:
+    """
+    Return the byte ranges of 'if'/'while' conditions (what the AST reports as the
+    condition's src) and of every 'pure' keyword, or None if the source is ambiguous.
+    Results are cached per source text.
+    """
+    source_bytes = source_code.encode('utf-8')
+    tokens = _tokenize(source_bytes)
+    if tokens is None:
+        return None
+
+    # Match brackets; for '{' also remember whether it opened a do-loop body
+    match = {}
+    do_block_close = set()
+    stack = []
+    for i, (kind, _, _, text) in enumerate(tokens):
+        if kind != 'punct':
+            continue
+        if text in _OPEN:
+            stack.append(i)
+        elif text in _CLOSE:
+            if not stack or _OPEN[tokens[stack[-1]][3]] != text:
+                return None
+            j = stack.pop()
+            match[j] = i
+            if text == b'}' and j > 0 and tokens[j - 1][3] == b'do':
+                do_block_close.add(i)
+    if stack:
+        return None
+
+    conditions = []
+    pure_ranges = []
+    for i, (kind, start, end, text) in enumerate(tokens):
+        if kind != 'ident':
+            continue
+        if text == b'pure':
+            pure_ranges.append((start, end))
+        elif text == b'do':
+            if i + 1 >= len(tokens) or tokens[i + 1][3] != b'{':
+                # brace-less do-body: its 'while' can't be told from a while-loop
+                return None
+        elif text == b'if' or text == b'while':
+            if text == b'while' and i > 0 and (i - 1) in do_block_close:
+                # do { ... } while (...): not an injection point
+                continue
+            if i + 1 >= len(tokens) or tokens[i + 1][3] != b'(':
+                return None
+            close = match[i + 1]
+            if close == i + 2:
+                return None
+            conditions.append((tokens[i + 2][1], tokens[close - 1][2],
+                               'IfStatement' if text == b'if' else 'WhileStatement'))
+    return conditions, pure_ranges
@@ -14,6 +14,10 @@ Updates:
 
 - Strategy: Identify decimals first and skip them, only obfuscate standalone integers.
 
+- Pragmas, SPDX lines, strings and decimals are matched by the same regex as integers,
+
+  so the source is scanned once and nothing has to be masked and restored afterwards.
+
 """
 
 
@@ -22,7 +26,7 @@ import re
 
 import random
 
-from typing import Dict, Tuple
+from typing import Dict, List, Tuple
 
 
 
@@ -32,25 +36,31 @@ random.seed()
 
 # ---------- Patterns ----------
 
-_PRAGMA_PATTERN = re.compile(r'^\s*pragma\s+solidity\s+[^;]+;', flags=re.IGNORECASE | re.MULTILINE)
+# One alternation, tried left to right at each position:
 
-_SPDX_PATTERN = re.compile(r'^\s*//\s*SPDX-License-Identifier:[^\r\n]*', flags=re.IGNORECASE | re.MULTILINE)
+# 1. pragma solidity ...;   (kept)
 
+# 2. SPDX license line      (kept)
 
+# 3. Strings: "..." or '...' (kept)
 
-# Improved Regex Pattern:
+# 4. Decimals/Floats: 1.2, 1., .5 (matched so we can SKIP them)
 
-# 1. Strings: "..." or '...'
+# 5. Integers: 123 (matched to OBFUSCATE)
 
-# 2. Decimals/Floats: 1.2, 1., .5 (Matched so we can SKIP them)
+_TOKEN_PATTERN = re.compile(
 
-# 3. Integers: 123 (Matched to OBFUSCATE)
+    r'(?P<pragma>^\s*pragma\s+solidity\s+[^;]+;)'
 
-_TOKEN_PATTERN = re.compile(
+    r'|(?P<spdx>^\s*//\s*SPDX-License-Identifier:[^\r\n]*)'
+
+    r'|(?P<str>"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\')'
 
-    r'("([^"\\]|\\.)*"|\'([^\'\\]|\\.)*\'|(\d+\.\d*|\.\d+)|(\b\d+\b))', 
+    r'|(?P<float>\d+\.\d*|\.\d+)'
 
-    re.DOTALL
+    r'|(?P<int>\b\d+\b)',
+
+    re.IGNORECASE | re.MULTILINE | re.DOTALL
 
 )
 
@@ -58,139 +68,175 @@ _TOKEN_PATTERN = re.compile(
 
 # ---------- BiAn Expression Generator ----------
 
-def _gen_expr_for(n: int) -> str:
+_STRATEGIES = ('linear', 'multiplicative', 'compound')
 
-    """ Generates complex arithmetic expressions (No division, no float). """
+_RANGE_1_20 = range(1, 21)
 
-    strategies = ['linear', 'multiplicative', 'compound']
+_RANGE_2_10 = range(2, 11)
 
-    strat = random.choice(strategies)
+_RANGE_0_50 = range(0, 51)
 
 
 
-    if strat == 'linear': # (a + b + diff)
+def _gen_exprs(values: List[int]) -> List[str]:
 
-        a = random.randint(1, 20); b = random.randint(1, 20)
+    """
 
-        diff = n - (a + b)
+    Generates complex arithmetic expressions (No division, no float) for a batch of
 
-        op = "+" if diff >= 0 else "-"
+    integers. All random draws are made up front with one random.choices call per
 
-        return f"({a} + {b} {op} {abs(diff)})"
+    operand range (random.randint costs several Python calls per draw).
 
+    """
 
+    k = len(values)
 
-    elif strat == 'multiplicative': # (a * b + diff)
+    choices = random.choices
 
-        a = random.randint(2, 10); b = random.randint(2, 10)
+    strats = choices(_STRATEGIES, k=k)
 
-        diff = n - (a * b)
+    ops_1_20 = choices(_RANGE_1_20, k=2 * k)
 
-        op = "+" if diff >= 0 else "-"
+    ops_2_10 = choices(_RANGE_2_10, k=2 * k)
 
-        return f"({a} * {b} {op} {abs(diff)})"
+    ops_0_50 = choices(_RANGE_0_50, k=k)
 
 
 
-    elif strat == 'compound': # (a + (b * c) - d)
+    exprs = []
 
-        a = random.randint(0, 50); b = random.randint(2, 10); c = random.randint(2, 10)
+    for i, n in enumerate(values):
 
-        current = a + (b * c)
+        strat = strats[i]
 
-        diff = n - current
+        if strat == 'linear': # (a + b + diff)
 
-        op = "+" if diff >= 0 else "-"
+            a = ops_1_20[2 * i]; b = ops_1_20[2 * i + 1]
 
-        return f"({a} + ({b} * {c}) {op} {abs(diff)})"
+            diff = n - (a + b)
 
+            op = "+" if diff >= 0 else "-"
 
+            exprs.append(f"({a} + {b} {op} {abs(diff)})")
 
-    return str(n)
 
 
+        elif strat == 'multiplicative': # (a * b + diff)
 
-# ---------- Main Logic ----------
+            a = ops_2_10[2 * i]; b = ops_2_10[2 * i + 1]
 
-def obfuscate_integers_preserve_pragma(source: str) -> str:
+            diff = n - (a * b)
 
-    # 1. Extract pragmas to protect them
+            op = "+" if diff >= 0 else "-"
 
-    placeholders = {}
+            exprs.append(f"({a} * {b} {op} {abs(diff)})")
 
-    counter = 0
 
-    def _mask(m):
 
-        nonlocal counter
+        else: # compound: (a + (b * c) - d)
 
-        k = f"__PRAGMA_{counter}__"
+            a = ops_0_50[i]; b = ops_2_10[2 * i]; c = ops_2_10[2 * i + 1]
 
-        placeholders[k] = m.group(0)
+            current = a + (b * c)
 
-        counter += 1
+            diff = n - current
 
-        return k
+            op = "+" if diff >= 0 else "-"
 
+            exprs.append(f"({a} + ({b} * {c}) {op} {abs(diff)})")
 
+    return exprs
 
-    body = _SPDX_PATTERN.sub(_mask, source)
 
-    body = _PRAGMA_PATTERN.sub(_mask, body)
 
+def _gen_expr_for(n: int) -> str:
 
+    """ Generates complex arithmetic expressions (No division, no float). """
 
-    # 2. Process tokens
+    return _gen_exprs([n])[0]
 
-    def _repl(m):
 
-        tok = m.group(0)
 
-        
+# ---------- Main Logic ----------
 
-        # Group 4 is Decimal/Float -> SKIP (Return as is)
+def obfuscate_integers_preserve_pragma(source: str, unique: bool = True) -> str:
 
-        if m.group(4): 
+    """
 
-            return tok
+    unique=True (default): every integer literal gets its own random expression.
 
-            
+    unique=False: one expression per distinct value, reused for every repeat
 
-        # Group 5 is Integer -> OBFUSCATE
+    (0, 1, 18, ... are very common) - faster, but repeats stay recognisable.
 
-        if m.group(5):
+    """
 
-            try:
+    # Single linear pass: protected text is skipped in place instead of being
+
+    # swapped for placeholders, so there is no per-placeholder restore scan.
+
+    # Pragmas, SPDX, strings and decimals -> SKIP; only integers are collected.
+
+    spans = []
+
+    values = []
 
-                n = int(tok)
+    for m in _TOKEN_PATTERN.finditer(source):
 
-                return _gen_expr_for(n)
+        if m.lastgroup == 'int':
+
+            try:
+
+                values.append(int(m.group(0)))
 
             except ValueError:
 
-                return tok
+                continue
+
+            spans.append(m.span())
+
+    if not spans:
+
+        return source
+
+
+
+    # Integer -> OBFUSCATE, expressions generated as one batch
+
+    if unique:
+
+        exprs = _gen_exprs(values)
+
+    else:
+
+        distinct = list(dict.fromkeys(values))
+
+        by_value = dict(zip(distinct, _gen_exprs(distinct)))
+
+        exprs = [by_value[n] for n in values]
+
 
-        
 
-        # Strings or others -> SKIP
+    parts = []
 
-        return tok
+    cursor = 0
 
+    for (start, end), expr in zip(spans, exprs):
 
+        parts.append(source[cursor:start])
 
-    obf_body = _TOKEN_PATTERN.sub(_repl, body)
+        parts.append(expr)
 
+        cursor = end
 
+    parts.append(source[cursor:])
 
-    # 3. Restore pragmas
+    return ''.join(parts)
 
-    for k, v in placeholders.items():
 
-        obf_body = obf_body.replace(k, v)
 
-    
 
-    return obf_body
 
 
 
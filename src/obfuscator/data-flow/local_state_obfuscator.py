@@ -2,11 +2,21 @@
 """Promote selected local variables to contract state variables (BiAn-inspired)."""
 from __future__ import annotations
 
+import functools
 import json
 import os
 import re
+from bisect import bisect_right
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
 
 @dataclass
@@ -15,62 +25,140 @@ class ContractInfo:
     name: str
     insert_pos_bytes: int
     counter: int
-    globals: List[Tuple[str, str]]  # list of (type, global_name)
+    # promoted globals as parallel lists: global_types[i] is the type of global_names[i] (utf-8)
+    global_types: List[bytes]
+    global_names: List[bytes]
 
 
 @dataclass
 class LocalVarInfo:
     contract_id: int
-    global_name: str
+    global_name: bytes  # utf-8, as it is spliced into the source bytes
     var_type: str
     statement_range: Tuple[int, int]
-    init_range: Tuple[int, int]
+    init_range: Optional[Tuple[int, int]]  # None when the declaration has no initial value
+
 
+# Opens the block of promoted declarations inserted at the top of each contract
+_GLOBALS_HEADER = b"\n    // === local-to-state promoted variables ===\n"
 
 _SUPPORTED_PRIMITIVES = (
     'uint', 'int', 'bool', 'address', 'bytes', 'string'
 )
 
-
+# AST keys that can lead to a contract, a local declaration statement or an Identifier
+# naming a local. Type names, type descriptions, documentation and parameter lists are
+# never walked. Node types missing from this table (e.g. from a newer solc) get a full scan.
+_CHILD_KEYS: Dict[str, Tuple[str, ...]] = {
+    'SourceUnit': ('nodes',),
+    'ContractDefinition': ('nodes',),
+    'FunctionDefinition': ('modifiers', 'body'),
+    'ModifierDefinition': ('body',),
+    'ModifierInvocation': ('arguments',),
+    'Block': ('statements',),
+    'UncheckedBlock': ('statements',),
+    'IfStatement': ('condition', 'trueBody', 'falseBody'),
+    'WhileStatement': ('condition', 'body'),
+    'DoWhileStatement': ('condition', 'body'),
+    'ForStatement': ('initializationExpression', 'condition', 'loopExpression', 'body'),
+    'TryStatement': ('externalCall', 'clauses'),
+    'TryCatchClause': ('block',),
+    'ExpressionStatement': ('expression',),
+    'VariableDeclarationStatement': ('initialValue',),
+    'Return': ('expression',),
+    'EmitStatement': ('eventCall',),
+    'RevertStatement': ('errorCall',),
+    'Assignment': ('leftHandSide', 'rightHandSide'),
+    'BinaryOperation': ('leftExpression', 'rightExpression'),
+    'UnaryOperation': ('subExpression',),
+    'Conditional': ('condition', 'trueExpression', 'falseExpression'),
+    'FunctionCall': ('expression', 'arguments'),
+    'FunctionCallOptions': ('expression', 'options'),
+    'MemberAccess': ('expression',),
+    'IndexAccess': ('baseExpression', 'indexExpression'),
+    'IndexRangeAccess': ('baseExpression', 'startExpression', 'endExpression'),
+    'TupleExpression': ('components',),
+}
+for _leaf in ('PragmaDirective', 'ImportDirective', 'UsingForDirective', 'StructDefinition',
+              'EnumDefinition', 'EventDefinition', 'ErrorDefinition', 'UserDefinedValueTypeDefinition',
+              'VariableDeclaration', 'PlaceholderStatement', 'Break', 'Continue', 'InlineAssembly',
+              'Identifier', 'Literal', 'ElementaryTypeNameExpression', 'NewExpression'):
+    _CHILD_KEYS[_leaf] = ()
+del _leaf
+
+
+@functools.lru_cache(maxsize=1 << 16)
 def _parse_src_range(src: str) -> Tuple[int, int]:
-    """Parse solc src string "start:length:file" -> (start, end)."""
-    parts = src.split(':')
-    start = int(parts[0])
-    length = int(parts[1]) if len(parts) > 1 else 0
+    """Parse solc src string "start:length:file" -> (start, end).
+    Cached, since the same src strings come back on every pass over a source."""
+    c1 = src.find(':')
+    if c1 == -1:
+        start = int(src)
+        return start, start
+    c2 = src.find(':', c1 + 1)
+    start = int(src[:c1])
+    length = int(src[c1 + 1:c2] if c2 != -1 else src[c1 + 1:])
     return start, start + length
 
 
+# Byte values (ints) of the characters _extend_statement_end looks for
+_SEMI, _SLASH, _STAR, _CR, _LF = b';/*\r\n'
+
+
+def _skip_blanks(source_bytes: bytes, idx: int) -> int:
+    """Index of the first byte at or after idx that is not a space or tab."""
+    # lstrip runs in C; short bounded slices avoid copying the rest of the source
+    while True:
+        chunk = source_bytes[idx:idx + 64]
+        skipped = len(chunk) - len(chunk.lstrip(b' \t'))
+        idx += skipped
+        if skipped < 64:
+            return idx
+
+
 def _extend_statement_end(source_bytes: bytes, start: int, end: int) -> int:
     """Extend a statement range to include trailing semicolons, comments, and newline."""
+    # Indexing bytes gives an int, so every check is an int compare with no 1-2 byte slice
     length = len(source_bytes)
     idx = end
-    if idx < length and source_bytes[idx:idx+1] == b';':
-        idx += 1
-    while idx < length and source_bytes[idx:idx+1] in (b' ', b'\t'):
-        idx += 1
-    if idx < length and source_bytes[idx:idx+2] == b'//':
-        newline_idx = source_bytes.find(b'\n', idx)
-        if newline_idx == -1:
-            idx = length
-        else:
-            idx = newline_idx
-    elif idx < length and source_bytes[idx:idx+2] == b'/*':
-        comment_end = source_bytes.find(b'*/', idx + 2)
-        if comment_end == -1:
-            idx = length
-        else:
-            idx = comment_end + 2
-    while idx < length and source_bytes[idx:idx+1] in (b' ', b'\t'):
-        idx += 1
-    if idx < length and source_bytes[idx:idx+2] == b'\r\n':
-        idx += 2
-    elif idx < length and source_bytes[idx:idx+1] in (b'\n', b'\r'):
+    if idx < length and source_bytes[idx] == _SEMI:
         idx += 1
+    idx = _skip_blanks(source_bytes, idx)
+    if idx + 1 < length and source_bytes[idx] == _SLASH:
+        second = source_bytes[idx + 1]
+        if second == _SLASH:
+            newline_idx = source_bytes.find(b'\n', idx)
+            if newline_idx == -1:
+                idx = length
+            else:
+                idx = newline_idx
+        elif second == _STAR:
+            comment_end = source_bytes.find(b'*/', idx + 2)
+            if comment_end == -1:
+                idx = length
+            else:
+                idx = comment_end + 2
+    idx = _skip_blanks(source_bytes, idx)
+    if idx < length:
+        byte = source_bytes[idx]
+        if byte == _CR:
+            idx += 2 if idx + 1 < length and source_bytes[idx + 1] == _LF else 1
+        elif byte == _LF:
+            idx += 1
     return idx
 
 
+# str.translate table: ASCII letters, digits and '_' map to themselves, anything else to '_'
+_IDENTIFIER_TABLE: Dict[int, str] = defaultdict(
+    lambda: '_', ((ord(c), c) for c in '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_')
+)
+# Data-location suffixes of a solc typeString, removed in one pass
+_LOCATION_SUFFIX = re.compile(r' (?:storage pointer|storage ref|storage|memory|calldata)')
+_WS_RUN = re.compile(r'\s+')
+
+
 def _sanitize_identifier(name: str) -> str:
-    sanitized = re.sub(r'[^0-9a-zA-Z_]', '_', name or 'var')
+    sanitized = (name or 'var').translate(_IDENTIFIER_TABLE)
     if not sanitized or sanitized[0].isdigit():
         sanitized = f'v_{sanitized}'
     return sanitized
@@ -84,14 +172,9 @@ def _sanitize_type(type_string: str) -> Optional[str]:
     lowered = type_string.lower()
     if any(bad in lowered for bad in ('struct ', 'mapping(', ' contract ', 'enum ', 'function (')):
         return None
-    base = type_string
     # remove pointer qualifiers
-    base = base.replace(' storage pointer', '')
-    base = base.replace(' storage ref', '')
-    base = base.replace(' storage', '')
-    base = base.replace(' memory', '')
-    base = base.replace(' calldata', '')
-    base = re.sub(r'\s+', ' ', base).strip()
+    base = _LOCATION_SUFFIX.sub('', type_string)
+    base = _WS_RUN.sub(' ', base).strip()
     # allow arrays and primitive types
     head = base.split('[')[0]
     if not head:
@@ -125,225 +208,312 @@ def _gather_contract_info(source_bytes: bytes, contract_node: dict) -> Optional[
             insert_pos = newline_idx + 1
         else:
             insert_pos = start + brace_offset + 1
-    return ContractInfo(ast_id=contract_id, name=name, insert_pos_bytes=insert_pos, counter=0, globals=[])
+    return ContractInfo(ast_id=contract_id, name=name, insert_pos_bytes=insert_pos, counter=0, global_types=[], global_names=[])
 
 
-def _collect_contract_infos(node, source_bytes: bytes, out: Dict[int, ContractInfo]) -> None:
-    if isinstance(node, dict):
-        if node.get('nodeType') == 'ContractDefinition':
-            info = _gather_contract_info(source_bytes, node)
-            if info:
-                out[node['id']] = info
-            for child in node.get('nodes', []):
-                _collect_contract_infos(child, source_bytes, out)
-        else:
-            for value in node.values():
-                if isinstance(value, (dict, list)):
-                    _collect_contract_infos(value, source_bytes, out)
-    elif isinstance(node, list):
-        for element in node:
-            _collect_contract_infos(element, source_bytes, out)
-
-
-def _get_default_value(type_str: str) -> str:
-    if type_str.startswith('bool'): return 'false'
-    if type_str.startswith('string'): return '""'
-    if type_str.startswith('bytes'): return '""'
-    if type_str.startswith('address'): return 'address(0)'
-    # ints/uints
-    return '0'
+def _child_values(node: dict) -> Iterable[Any]:
+    keys = _CHILD_KEYS.get(node.get('nodeType'))
+    if keys is None:
+        return node.values()
+    return [node.get(key) for key in keys]
 
 
-def _traverse(node, contract_stack: List[ContractInfo], local_infos: Dict[int, LocalVarInfo],
-              source_bytes: bytes, function_skip_stack: List[bool],
-              contract_lookup: Dict[int, ContractInfo]) -> None:
-    if isinstance(node, dict):
+def _get_default_value(type_str: str) -> bytes:
+    if type_str.startswith('bool'): return b'false'
+    if type_str.startswith('string'): return b'""'
+    if type_str.startswith('bytes'): return b'""'
+    if type_str.startswith('address'): return b'address(0)'
+    # ints/uints
+    return b'0'
+
+
+# Markers pushed on the walk stack to leave a contract / function scope once its children are done
+_END_CONTRACT = object()
+_END_FUNCTION = object()
+
+
+def _push_children(stack: List[Any], values: Iterable[Any]) -> None:
+    """Push the dict/list children in reverse so they are popped in document order."""
+    stack.extend(reversed([value for value in values if isinstance(value, (dict, list))]))
+
+
+def _record_local(node: dict, contract_stack: List[Optional[ContractInfo]], local_infos: Dict[int, LocalVarInfo],
+                  source_bytes: bytes, function_skip_stack: List[bool]) -> None:
+    """Register node as a promoted local if it is a single, simple-typed declaration."""
+    if not contract_stack:
+        return
+    if any(function_skip_stack):
+        return
+    declarations = node.get('declarations') or []
+    if len(declarations) != 1:
+        return
+    declaration = declarations[0]
+    if not declaration or declaration.get('stateVariable'):
+        return
+    if not declaration.get('name'):
+        return
+    
+    initial = node.get('initialValue')
+    # ALLOW missing initial value now (for hoisted vars)
+    
+    type_string = (declaration.get('typeDescriptions') or {}).get('typeString')
+    var_type = _sanitize_type(type_string)
+    if not var_type:
+        return
+    contract_info = contract_stack[-1]
+    if contract_info is None:
+        # enclosing contract has no usable body to insert the globals into
+        return
+    try:
+        stmt_start, stmt_end = _parse_src_range(node['src'])
+        stmt_end = _extend_statement_end(source_bytes, stmt_start, stmt_end)
+        if initial:
+            init_start, init_end = _parse_src_range(initial['src'])
+            init_range = (init_start, init_end)
+        else:
+            init_range = None
+    except Exception:
+        return
+    
+    sanitized_name = _sanitize_identifier(declaration['name'])
+    counter = contract_info.counter
+    contract_info.counter = counter + 1
+    global_name = f"__state_{sanitized_name}_{counter}".encode('utf-8')
+    contract_info.global_types.append(var_type.encode('utf-8'))
+    contract_info.global_names.append(global_name)
+    decl_id = declaration.get('id')
+    if decl_id is None:
+        return
+    local_infos[decl_id] = LocalVarInfo(
+        contract_id=contract_info.ast_id,
+        global_name=global_name,
+        var_type=var_type,
+        statement_range=(stmt_start, stmt_end),
+        init_range=init_range
+    )
+
+
+# contracts, promoted locals by declaration id, (referencedDeclaration, src) of each Identifier
+_WalkResult = Tuple[List[ContractInfo], Dict[int, LocalVarInfo], List[Tuple[int, Optional[str]]]]
+
+
+def _walk_all(ast: dict, source_bytes: bytes) -> _WalkResult:
+    """
+    Single iterative pre-order walk over the AST. Returns the contracts, the promoted
+    locals, and (referencedDeclaration, src) of every Identifier; the identifiers are
+    matched against the locals once the walk is complete.
+    """
+    contracts: List[ContractInfo] = []
+    local_infos: Dict[int, LocalVarInfo] = {}
+    identifiers: List[Tuple[int, Optional[str]]] = []
+    contract_stack: List[Optional[ContractInfo]] = []
+    function_skip_stack: List[bool] = []
+    # Scope exits are handled by the _END_* markers
+    stack: List[Any] = [ast]
+    while stack:
+        node = stack.pop()
+        if node is _END_CONTRACT:
+            contract_stack.pop()
+            continue
+        if node is _END_FUNCTION:
+            function_skip_stack.pop()
+            continue
+        if isinstance(node, list):
+            _push_children(stack, node)
+            continue
+        if not isinstance(node, dict):
+            continue
         node_type = node.get('nodeType')
+        if node_type == 'Identifier':
+            ref_id = node.get('referencedDeclaration')
+            if ref_id is not None:
+                identifiers.append((ref_id, node.get('src')))
+            continue
         if node_type == 'ContractDefinition':
-            contract_id = node.get('id')
-            info = contract_lookup.get(contract_id)
-            if info is None:
-                info = _gather_contract_info(source_bytes, node)
-                if info:
-                    contract_lookup[contract_id] = info
-            contract_stack.append(info if info else ContractInfo(ast_id=-1, name='Unknown', insert_pos_bytes=0, counter=0, globals=[]))
-            for child in node.get('nodes', []):
-                _traverse(child, contract_stack, local_infos, source_bytes, function_skip_stack, contract_lookup)
-            contract_stack.pop()
-            return
+            # Each contract is reached exactly once, so its info is computed here and nowhere else
+            info = _gather_contract_info(source_bytes, node)
+            if info:
+                contracts.append(info)
+            contract_stack.append(info)  # None: locals of this contract are not promoted
+            stack.append(_END_CONTRACT)
+            _push_children(stack, node.get('nodes', []))
+            continue
         if node_type == 'FunctionDefinition':
             mutability = (node.get('stateMutability') or '').lower()
-            is_skip = mutability in ('pure', 'view')
-            function_skip_stack.append(is_skip)
-            # traverse body & other children
-            for key, value in node.items():
-                if isinstance(value, (dict, list)):
-                    _traverse(value, contract_stack, local_infos, source_bytes, function_skip_stack, contract_lookup)
-            function_skip_stack.pop()
-            return
+            function_skip_stack.append(mutability in ('pure', 'view'))
+            stack.append(_END_FUNCTION)
+            # traverse modifiers & body
+            _push_children(stack, _child_values(node))
+            continue
         if node_type == 'VariableDeclarationStatement':
-            if not contract_stack:
-                return
-            if any(function_skip_stack):
-                return
-            declarations = node.get('declarations') or []
-            if len(declarations) != 1:
-                return
-            declaration = declarations[0]
-            if not declaration or declaration.get('stateVariable'):
-                return
-            if not declaration.get('name'):
-                return
-            
-            initial = node.get('initialValue')
-            # ALLOW missing initial value now (for hoisted vars)
-            
-            type_string = (declaration.get('typeDescriptions') or {}).get('typeString')
-            var_type = _sanitize_type(type_string)
-            if not var_type:
-                return
-            contract_info = contract_stack[-1]
-            if contract_info.insert_pos_bytes == 0 and contract_info.name == 'Unknown':
-                return
-            try:
-                stmt_start, stmt_end = _parse_src_range(node['src'])
-                stmt_end = _extend_statement_end(source_bytes, stmt_start, stmt_end)
-                if initial:
-                    init_start, init_end = _parse_src_range(initial['src'])
-                    init_range = (init_start, init_end)
-                else:
-                    init_range = None
-            except Exception:
-                return
-            
-            sanitized_name = _sanitize_identifier(declaration['name'])
-            global_name = f"__state_{sanitized_name}_{contract_stack[-1].counter}"
-            contract_stack[-1].counter += 1
-            contract_stack[-1].globals.append((var_type, global_name))
-            decl_id = declaration.get('id')
-            if decl_id is None:
-                return
-            local_infos[decl_id] = LocalVarInfo(
-                contract_id=contract_stack[-1].ast_id,
-                global_name=global_name,
-                var_type=var_type,
-                statement_range=(stmt_start, stmt_end),
-                init_range=init_range
-            )
-            # still traverse children for nested identifiers (initial value, etc.)
-        # Continue traversal for nested nodes
-        for key, value in node.items():
-            if isinstance(value, (dict, list)):
-                _traverse(value, contract_stack, local_infos, source_bytes, function_skip_stack, contract_lookup)
-    elif isinstance(node, list):
-        for element in node:
-            _traverse(element, contract_stack, local_infos, source_bytes, function_skip_stack, contract_lookup)
-
-
-
-def _collect_identifier_occurrences(node, target_ids: Dict[int, LocalVarInfo], occurrences: List[Tuple[int, int, str]],
-                                     statement_ranges: List[Tuple[int, int]]) -> None:
-    if isinstance(node, dict):
-        if node.get('nodeType') == 'Identifier':
-            ref_id = node.get('referencedDeclaration')
-            if ref_id in target_ids:
-                try:
-                    start, end = _parse_src_range(node['src'])
-                except Exception:
-                    start = end = -1
-                if start >= 0:
-                    # Skip identifiers inside the original declaration statement (they will be replaced wholesale)
-                    if any(stmt_start <= start and end <= stmt_end for stmt_start, stmt_end in statement_ranges):
-                        pass
-                    else:
-                        occurrences.append((start, end, target_ids[ref_id].global_name))
-        for value in node.values():
-            if isinstance(value, (dict, list)):
-                _collect_identifier_occurrences(value, target_ids, occurrences, statement_ranges)
-    elif isinstance(node, list):
-        for element in node:
-            _collect_identifier_occurrences(element, target_ids, occurrences, statement_ranges)
-
-
-def convert_locals_to_state(source_text: str, ast_json_path: Optional[str] = None) -> Tuple[str, int]:
-    """Promote selected local variables to contract state variables."""
-    if not ast_json_path or not os.path.exists(ast_json_path):
-        return source_text, 0
+            _record_local(node, contract_stack, local_infos, source_bytes, function_skip_stack)
+        # Continue traversal for nested nodes (initial values can reference other locals)
+        _push_children(stack, _child_values(node))
+    return contracts, local_infos, identifiers
+
+
+def _walk_parallel(contract_nodes: List[dict], source_bytes: bytes, workers: int) -> _WalkResult:
+    """
+    Walk each top-level contract in a process pool and merge the results in document
+    order. Contracts are independent: locals, counters and the identifiers that
+    reference them never cross a contract boundary.
+    """
+    contracts: List[ContractInfo] = []
+    local_infos: Dict[int, LocalVarInfo] = {}
+    identifiers: List[Tuple[int, Optional[str]]] = []
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker,
+                             initargs=(source_bytes,)) as pool:
+        for part_contracts, part_locals, part_identifiers in pool.map(_walk_in_worker, contract_nodes):
+            contracts.extend(part_contracts)
+            local_infos.update(part_locals)
+            identifiers.extend(part_identifiers)
+    return contracts, local_infos, identifiers
 
-    try:
-        with open(ast_json_path, 'r', encoding='utf-8') as f:
-            ast = json.load(f)
-    except Exception as exc:
-        print(f"[WARN] Failed to load AST for local-to-state conversion: {exc}")
-        return source_text, 0
 
-    source_bytes = source_text.encode('utf-8')
+# Source bytes of the current convert_locals_to_state call, set once per worker process
+_worker_source = b''
 
-    contract_lookup: Dict[int, ContractInfo] = {}
-    _collect_contract_infos(ast, source_bytes, contract_lookup)
 
-    contract_stack: List[ContractInfo] = []
-    local_infos: Dict[int, LocalVarInfo] = {}
+def _init_worker(source_bytes: bytes) -> None:
+    global _worker_source
+    _worker_source = source_bytes
+
+
+def _walk_in_worker(contract_node: dict) -> _WalkResult:
+    return _walk_all(contract_node, _worker_source)
 
-    _traverse(ast, contract_stack, local_infos, source_bytes, function_skip_stack=[], contract_lookup=contract_lookup)
+
+def _collect_identifier_occurrences(identifiers: List[Tuple[int, Optional[str]]], target_names: Dict[int, bytes],
+                                    statement_ranges: List[Tuple[int, int]],
+                                    starts: List[int], ends: List[int], texts: List[bytes]) -> None:
+    """Append a replacement for every identifier referencing a promoted local.
+    target_names maps the local's declaration id to its encoded global name."""
+    # Declaration statements don't overlap, so the only one that can contain an
+    # identifier is the last one starting at or before it
+    ranges = sorted(statement_ranges)
+    range_starts = [stmt_start for stmt_start, _ in ranges]
+    for ref_id, src in identifiers:
+        global_name = target_names.get(ref_id)
+        if global_name is None:
+            continue
+        try:
+            start, end = _parse_src_range(src)
+        except Exception:
+            continue
+        if start < 0:
+            continue
+        # Skip identifiers inside the original declaration statement (they will be replaced wholesale)
+        idx = bisect_right(range_starts, start) - 1
+        if idx >= 0 and end <= ranges[idx][1]:
+            continue
+        starts.append(start)
+        ends.append(end)
+        texts.append(global_name)
+
+
+@functools.lru_cache(maxsize=8)
+def _load_ast(path: str, mtime_ns: int, size: int) -> dict:
+    """Parse the AST JSON at path. mtime and size are part of the cache key, so a
+    rewritten file is parsed again. The returned dict is shared: treat it as read-only."""
+    with open(path, 'rb') as f:
+        return _json_loads(f.read())
+
+
+def convert_locals_to_state(source_text: str, ast_json_path: Optional[str] = None,
+                            ast: Optional[Dict] = None, workers: int = 1) -> Tuple[str, int]:
+    """Promote selected local variables to contract state variables.
+    An already-parsed `ast` dict takes precedence over `ast_json_path`.
+    With workers != 1 and several contracts in the source, the contracts are walked in
+    a process pool (0 = one per CPU); the result is the same as with a single worker."""
+    if ast is None:
+        if not ast_json_path or not os.path.exists(ast_json_path):
+            return source_text, 0
+
+        try:
+            stat = os.stat(ast_json_path)
+            ast = _load_ast(ast_json_path, stat.st_mtime_ns, stat.st_size)
+        except Exception as exc:
+            print(f"[WARN] Failed to load AST for local-to-state conversion: {exc}")
+            return source_text, 0
+
+    source_bytes = source_text.encode('utf-8')
+
+    contract_nodes: List[dict] = []
+    if workers != 1:
+        contract_nodes = [node for node in ast.get('nodes') or []
+                          if isinstance(node, dict) and node.get('nodeType') == 'ContractDefinition']
+    if len(contract_nodes) > 1:
+        contracts, local_infos, identifiers = _walk_parallel(contract_nodes, source_bytes, workers)
+    else:
+        contracts, local_infos, identifiers = _walk_all(ast, source_bytes)
 
     if not local_infos:
         return source_text, 0
 
-    # Gather identifier occurrences referencing promoted locals
-    occurrences: List[Tuple[int, int, str]] = []
-    statement_ranges = [info.statement_range for info in local_infos.values()]
-    _collect_identifier_occurrences(ast, local_infos, occurrences, statement_ranges)
+    # Replacements are kept as parallel lists: bytes [starts[i], ends[i]) become texts[i]
+    starts: List[int] = []
+    ends: List[int] = []
+    texts: List[bytes] = []
+
+    # Insert global declarations per contract. They go in first so that the stable sort
+    # below keeps a block inserted at a statement's start in front of that statement.
+    for contract_info in contracts:
+        if not contract_info.global_names:
+            continue
+        block = _GLOBALS_HEADER + b"".join([b"    %s private %s;\n" % decl for decl in
+                                            zip(contract_info.global_types, contract_info.global_names)])
+        starts.append(contract_info.insert_pos_bytes)
+        ends.append(contract_info.insert_pos_bytes)
+        texts.append(block)
 
-    # Prepare replacements for declaration statements
-    replacements: List[Tuple[int, int, bytes]] = []
+    # Prepare replacements for declaration statements (built as bytes, nothing is decoded)
     for info in local_infos.values():
         start, end = info.statement_range
         
         if info.init_range:
             init_start, init_end = info.init_range
-            init_expr = source_bytes[init_start:init_end].decode('utf-8').strip()
+            init_expr = source_bytes[init_start:init_end].strip()
         else:
             # Generate default value
             init_expr = _get_default_value(info.var_type)
         
         stmt_bytes = source_bytes[start:end]
-        stmt_text = stmt_bytes.decode('utf-8')
-        leading_ws = re.match(r'\s*', stmt_text).group(0)
+        leading_ws = stmt_bytes[:len(stmt_bytes) - len(stmt_bytes.lstrip())]
         
         # Look for trailing parts (comments, etc) after semicolon if present
-        semicolon_idx = stmt_text.find(';')
+        semicolon_idx = stmt_bytes.find(b';')
         if semicolon_idx == -1:
-            semicolon_idx = len(stmt_text)
-            after_semicolon = ""
+            after_semicolon = b""
         else:
-            after_semicolon = stmt_text[semicolon_idx+1:]
+            after_semicolon = stmt_bytes[semicolon_idx+1:]
         
-        new_stmt = f"{leading_ws}{info.global_name} = {init_expr};{after_semicolon}"
-        replacements.append((start, end, new_stmt.encode('utf-8')))
+        starts.append(start)
+        ends.append(end)
+        texts.append(b"%s%s = %s;%s" % (leading_ws, info.global_name, init_expr, after_semicolon))
 
-    # Combine identifier replacements
-    for start, end, global_name in occurrences:
-        replacements.append((start, end, global_name.encode('utf-8')))
-
-    # Insert global declarations per contract
-    for contract_info in contract_lookup.values():
-        if not contract_info.globals:
+    # Identifier occurrences referencing promoted locals
+    statement_ranges = [info.statement_range for info in local_infos.values()]
+    target_names = {decl_id: info.global_name for decl_id, info in local_infos.items()}
+    _collect_identifier_occurrences(identifiers, target_names, statement_ranges, starts, ends, texts)
+
+    # Apply replacements in one forward pass: unchanged spans and replacement texts are
+    # joined once instead of splicing the whole buffer per replacement. Only the
+    # indices are sorted; the three lists stay as they are.
+    order = sorted(range(len(starts)), key=starts.__getitem__)
+    view = memoryview(source_bytes)
+    segments: List[Any] = []
+    cursor = 0
+    for i in order:
+        start = starts[i]
+        if start < cursor:
+            # overlaps the previous replacement
             continue
-        block_lines = ["", "    // === local-to-state promoted variables ==="]
-        for var_type, global_name in contract_info.globals:
-            block_lines.append(f"    {var_type} private {global_name};")
-        block_lines.append("")
-        block = "\n".join(block_lines).encode('utf-8')
-        replacements.append((contract_info.insert_pos_bytes, contract_info.insert_pos_bytes, block))
-
-    # Apply replacements (sorted descending to keep offsets stable)
-    replacements.sort(key=lambda x: x[0], reverse=True)
-    out_bytes = source_bytes
-    for start, end, text in replacements:
-        out_bytes = out_bytes[:start] + text + out_bytes[end:]
-
-    return out_bytes.decode('utf-8'), len(local_infos)
+        segments.append(view[cursor:start])
+        segments.append(texts[i])
+        cursor = ends[i]
+    segments.append(view[cursor:])
+
+    return b''.join(segments).decode('utf-8'), len(local_infos)
 
 
 __all__ = ["convert_locals_to_state"]
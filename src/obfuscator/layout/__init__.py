@@ -1,4 +1,4 @@
 # layout package
-from .comment_remover import CommentRemover, run_comment_removal, show_comparison
+from .comment_remover import CommentRemover, run_comment_removal, run_comment_removal_batch, show_comparison
 from .format_scrambler import scramble_format
 from .variable_renamer import VariableRenamer
@@ -5,64 +5,173 @@ Remove all comments from Solidity source code for distribution.
 Based on: BiAn Smart Contract Source Code Obfuscation Paper
 """
 
+import functools
+import mmap
 import os
 import re
 import time
-from typing import List, Dict, Tuple, Optional
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Tuple, Optional, Union
+
+# Lexer for _comment_spans: one match per string literal or comment, with the
+# code in between skipped by the regex engine itself. Strings are consumed whole,
+# so comment markers inside them are never seen. A string literal cannot span
+# lines; an unterminated block comment runs to the end of the source.
+# Block comments use the unrolled form /\*[^*]*\*+(?:[^/*][^*]*\*+)*/: greedy
+# character-class runs instead of a lazy [\s\S]*? that tests for '*/' at every char.
+_TOKEN_RE = re.compile(r"""
+    "(?:\\[\s\S]|[^"\\\n])*"?
+  | '(?:\\[\s\S]|[^'\\\n])*'?
+  | (?P<comment>//[^\n\r]*|/\*[^*]*\*+(?:[^/*][^*]*\*+)*/|/\*[\s\S]*)
+""", re.VERBOSE)
+# The same lexer over UTF-8 bytes: every delimiter is ASCII, so offsets are byte offsets
+_TOKEN_RE_BYTES = re.compile(_TOKEN_RE.pattern.encode('ascii'), re.VERBOSE)
+
+# Comment pattern for show_comparison, compiled once at import.
+# '//' also covers '///' natspec lines.
+_COMMENT_RE = re.compile(r'/\*[\s\S]*?\*/|//[^\n\r]*')
+
+def _comment_spans(src: Union[str, bytes]) -> Tuple[array, array]:
+    """Start and end offsets of every comment in src, in source order, as two int arrays.
+    src may be a str or a UTF-8 bytes-like buffer (character or byte offsets respectively)."""
+    starts = array('q')
+    ends = array('q')
+    if isinstance(src, str):
+        token_re, slash, dquote, squote = _TOKEN_RE, '/', '"', "'"
+    else:
+        token_re, slash, dquote, squote = _TOKEN_RE_BYTES, b'/', b'"', b"'"
+    find = src.find
+    n = len(src)
+    # Every comment starts with '/': without one there is nothing to scan
+    next_slash = find(slash)
+    if next_slash == -1:
+        return starts, ends
+    # Tokens can only start at '/', '"' or "'". The next position of each is found with
+    # find (a C memchr over plain code) and only looked up again once the scan has
+    # passed it, so each stretch of code is searched once per character.
+    next_dquote = find(dquote)
+    next_squote = find(squote)
+    if next_dquote == -1:
+        next_dquote = n
+    if next_squote == -1:
+        next_squote = n
+    # Bound methods hoisted out of the loop
+    match = token_re.match
+    add_start = starts.append
+    add_end = ends.append
+    pos = 0
+    while True:
+        if next_slash < pos:
+            next_slash = find(slash, pos)
+            if next_slash == -1:
+                next_slash = n
+        if next_dquote < pos:
+            next_dquote = find(dquote, pos)
+            if next_dquote == -1:
+                next_dquote = n
+        if next_squote < pos:
+            next_squote = find(squote, pos)
+            if next_squote == -1:
+                next_squote = n
+        start = min(next_slash, next_dquote, next_squote)
+        if start >= n:
+            break
+        token = match(src, start)
+        if token is None:
+            # a '/' that is not a comment opener
+            pos = start + 1
+            continue
+        pos = token.end()
+        if token.lastgroup == 'comment':
+            add_start(start)
+            add_end(pos)
+    return starts, ends
+
+def _strip_spans(src: str, starts: array, ends: array) -> str:
+    """src without the given spans. The spans are sorted and disjoint: keep the text
+    between them and join once, instead of rebuilding the whole string per comment."""
+    if not starts:
+        return src
+    parts: List[str] = []
+    cursor = 0
+    for start, end in zip(starts, ends):
+        parts.append(src[cursor:start])
+        cursor = end
+    parts.append(src[cursor:])
+    return ''.join(parts)
+
+def _strip_spans_bytes(buf: bytes, starts: array, ends: array) -> bytes:
+    """_strip_spans for a bytes-like buffer; the kept spans are memoryview slices,
+    so the joined output is the only copy made."""
+    view = memoryview(buf)
+    parts: List[memoryview] = []
+    cursor = 0
+    for start, end in zip(starts, ends):
+        parts.append(view[cursor:start])
+        cursor = end
+    parts.append(view[cursor:])
+    return b''.join(parts)
+
+class CommentOp(NamedTuple):
+    """A removed comment: its [start, end) span in the original source."""
+    start: int
+    end: int
+
+    def text(self, src: str) -> str:
+        """The comment's text, sliced from the source it was found in."""
+        return src[self.start:self.end]
 
 class CommentRemover:
     """Remove comments from smart contract source code"""
+    __slots__ = ('src',)
     
     def __init__(self, source: str):
         self.src = source
 
-    def remove_comments(self) -> Tuple[str, List[Dict]]:
+    def remove_comments(self) -> Tuple[str, List[CommentOp]]:
         """Remove all comments (line, natspec, block) from the source code.
 
-        Performs a single-pass scan over the source to avoid double-processing
-        the same regions (e.g., `///` being matched by both `///` and `//`).
+        Performs a single left-to-right scan that tracks string literals and
+        comments together, so comment markers inside "..." or '...' are kept
+        and no part of the source is scanned twice.
         """
-        result = self.src
-        operations: List[Dict] = []
-
-        # Combined comment pattern. Order matters: match natspec before //.
-        combined_pattern = r'/\*[\s\S]*?\*/|///[^\n\r]*|//[^\n\r]*'
-
-        for match in re.finditer(combined_pattern, result):
-            start, end = match.start(), match.end()
-            comment_text = match.group()
-
-            # Skip if inside string literal
-            if self._is_inside_string(start, result):
-                continue
-
-            operations.append({
-                'start': start,
-                'end': end,
-                'replacement': '',  # removal only
-                'strategy': 'remove',
-                'original': comment_text
-            })
-
-        # Apply operations in reverse order to maintain positions
-        for op in sorted(operations, key=lambda x: x['start'], reverse=True):
-            result = result[:op['start']] + op['replacement'] + result[op['end']:]
-
-        return result, operations
-
-    def _is_inside_string(self, position: int, text: str) -> bool:
-        """Check if position is inside a string literal"""
-        text_before = text[:position]
-        
-        # Count unescaped double quotes
-        dquote_count = 0
-        i = 0
-        while i < len(text_before):
-            if text_before[i] == '"' and (i == 0 or text_before[i-1] != '\\'):
-                dquote_count += 1
-            i += 1
-        
-        return dquote_count % 2 == 1
+        src = self.src
+        starts, ends = _comment_spans(src)
+        operations = [CommentOp(start, end) for start, end in zip(starts, ends)]
+        return _strip_spans(src, starts, ends), operations
+
+    def remove_comments_bytes(self) -> bytes:
+        """The UTF-8 encoded source without its comments, for callers that work on bytes.
+        The encoded buffer is scanned directly and never decoded."""
+        buf = self.src.encode('utf-8')
+        starts, ends = _comment_spans(buf)
+        if not starts:
+            return buf
+        return _strip_spans_bytes(buf, starts, ends)
+
+# Larger sources are not memoized, to bound the memory the cache can hold
+_CACHE_MAX_CHARS = 4 * 1024 * 1024
+
+@functools.lru_cache(maxsize=32)
+def _remove_comments_cached(source_text: str) -> str:
+    """Comment-free source, memoized for pipelines that strip the same text repeatedly."""
+    return _strip_spans(source_text, *_comment_spans(source_text))
+
+def _remove_comments_from_file(file_path: str) -> Optional[str]:
+    """Comment-free text of a file. The file is memory-mapped and lexed as bytes, so
+    only the kept text is ever copied and decoded. Returns None for files with '\r'
+    line endings: text-mode reading translates those before lexing, which the raw
+    bytes can't reproduce."""
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # mmap cannot map an empty file
+            return ''
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm.find(b'\r') != -1:
+                return None
+            starts, ends = _comment_spans(mm)
+            return _strip_spans_bytes(mm, starts, ends).decode('utf-8')
 
 def run_comment_removal(source_text: Optional[str] = None, file_path: Optional[str] = None) -> str:
     """Run comment removal on test contract"""
@@ -70,27 +179,55 @@ def run_comment_removal(source_text: Optional[str] = None, file_path: Optional[s
     if not source_text and not file_path:
         raise ValueError("Must provide either source_text or file_path to run_comment_removal().")
 
-    # Load source
+    # Load source; files are stripped straight from a memory map when possible
     if source_text is None:
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"Source file not found: {file_path}")
+        removed_code = _remove_comments_from_file(file_path)
+        if removed_code is not None:
+            return removed_code
         with open(file_path, 'r', encoding='utf-8') as f:
             source_text = f.read()
 
     # Perform removal
-    remover = CommentRemover(source_text)
     start_time = time.time()
-    removed_code, operations = remover.remove_comments()
+    if len(source_text) <= _CACHE_MAX_CHARS:
+        removed_code = _remove_comments_cached(source_text)
+    else:
+        removed_code = _strip_spans(source_text, *_comment_spans(source_text))
     duration = time.time() - start_time
 
     # Comment removal completed silently
     return removed_code
 
-def show_comparison(original_code: str, processed_code: str) -> None:
-    """Display before/after comment counts for quick sanity check."""
-    pattern = r'//[^\n\r]*|/\*[\s\S]*?\*/|///[^\n\r]*'
-    orig_comments = len(re.findall(pattern, original_code))
-    new_comments = len(re.findall(pattern, processed_code))
+def _run_comment_removal_on_file(file_path: str) -> str:
+    # Module-level so the process pool can pickle it
+    return run_comment_removal(file_path=file_path)
+
+def run_comment_removal_batch(file_paths: List[str], workers: int = 1) -> Dict[str, str]:
+    """Run comment removal on several files: {file_path: comment-free source}.
+    With workers != 1 the files are processed in a process pool (0 = one per CPU)."""
+    if workers == 1 or len(file_paths) <= 1:
+        return {path: run_comment_removal(file_path=path) for path in file_paths}
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        return dict(zip(file_paths, pool.map(_run_comment_removal_on_file, file_paths, chunksize=8)))
+
+def show_comparison(original_code: str, processed_code: str, operations: Optional[List[CommentOp]] = None) -> None:
+    """Display before/after comment counts for quick sanity check.
+    With the operations returned by remove_comments the counts are known without
+    scanning; set BIAN_VERIFY to still check processed_code for leftover comments."""
+    if operations is not None:
+        new_comments = 0
+        if os.environ.get('BIAN_VERIFY') and '/' in processed_code:
+            new_comments = sum(1 for _ in _COMMENT_RE.finditer(processed_code))
+        print(f"[INFO] Comments before: {len(operations)}, after removal: {new_comments}")
+        return
+    if '/' not in original_code and '/' not in processed_code:
+        print("[INFO] Comments before: 0, after removal: 0")
+        return
+    # Count matches without building a list of the comment strings
+    orig_comments = sum(1 for _ in _COMMENT_RE.finditer(original_code))
+    new_comments = sum(1 for _ in _COMMENT_RE.finditer(processed_code))
     print(f"[INFO] Comments before: {orig_comments}, after removal: {new_comments}")
 
 if __name__ == "__main__":
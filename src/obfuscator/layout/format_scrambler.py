@@ -13,7 +13,7 @@ Usage:
 
 import re
 import sys
-from typing import List, Tuple
+from typing import List, Optional, TextIO, Tuple
 
 # ---------- Utility: classify token ----------
 def is_identifier(tok: str) -> bool:
@@ -67,137 +67,146 @@ def remove_comments_from_segment(seg: str) -> str:
     return seg
 
 # ---------- Step 3: normalize pragma ----------
+_PRAGMA_SOLIDITY = re.compile(r'pragma\s+solidity\s+[^;]+;', flags=re.IGNORECASE)
+
 def normalize_pragma(seg: str, solidity_version: str = "^0.8.30") -> str:
+    # Almost no segment holds a pragma: a substring check is much cheaper than the regex
+    if 'pragma' not in seg.lower():
+        return seg
     # Replace any pragma solidity ... ; with pragma solidity ^0.8.30;
-    seg = re.sub(r'pragma\s+solidity\s+[^;]+;', f'pragma solidity {solidity_version};', seg, flags=re.IGNORECASE)
-    return seg
+    return _PRAGMA_SOLIDITY.sub(lambda m: f'pragma solidity {solidity_version};', seg)
 
 # ---------- Step 4: simple tokenizer for non-string segments ----------
+# Character classes, so the tokenizer does one table lookup per character
+# instead of several str method calls:
+#   's' whitespace, 'a' identifier start, 'd' digit, 'n' other alnum, 'o' anything else
+def _classify_char(c: str) -> str:
+    if c.isspace():
+        return 's'
+    if c.isalpha() or c == '_':
+        return 'a'
+    if c.isdigit():
+        return 'd'
+    if c.isalnum():
+        return 'n'
+    return 'o'
+
+_ASCII_CLASSES = {i: _classify_char(chr(i)) for i in range(128)}
+_SPACE_RUN = re.compile(r's*')
+_IDENT_TAIL = re.compile(r'[adn]*')
+_DIGIT_RUN = re.compile(r'd*')
+_HEX_RUN = re.compile(r'[0-9A-Fa-f]*')
+_MULTI_OPS = frozenset({'==','!=','<=','>=','+=','-=','*=','/=','&&','||','<<','>>','=>','->','::','%='})
+
+def classify_chars(s: str) -> str:
+    """Map every character of s to its class letter (same length as s)."""
+    table = _ASCII_CLASSES
+    non_ascii = [c for c in set(s) if ord(c) >= 128]
+    if non_ascii:
+        table = dict(table)
+        for c in non_ascii:
+            table[ord(c)] = _classify_char(c)
+    return s.translate(table)
+
 def tokenize_non_string(s: str) -> List[str]:
     tokens: List[str] = []
+    classes = classify_chars(s)
     i = 0
     n = len(s)
-    hexdigits = set("0123456789abcdefABCDEF")
     while i < n:
-        c = s[i]
-        if c.isspace():
+        cls = classes[i]
+        if cls == 's':
             # collapse continuous whitespace into a single space token to mark separation
-            j = i
-            while j < n and s[j].isspace():
-                j += 1
             tokens.append(' ')
-            i = j
-        elif c.isalpha() or c == '_':
-            j = i + 1
-            while j < n and (s[j].isalnum() or s[j] == '_'):
-                j += 1
+            i = _SPACE_RUN.match(classes, i).end()
+        elif cls == 'a':
+            j = _IDENT_TAIL.match(classes, i + 1).end()
             tokens.append(s[i:j])
             i = j
-        elif c.isdigit():
+        elif cls == 'd':
             # number or decimal (we keep simple integer or hex)
             if i + 1 < n and s[i:i+2].lower() == '0x':
-                j = i + 2
-                while j < n and s[j] in hexdigits:
-                    j += 1
-                tokens.append(s[i:j])
-                i = j
+                j = _HEX_RUN.match(s, i + 2).end()
             else:
-                j = i + 1
-                while j < n and s[j].isdigit():
-                    j += 1
-                tokens.append(s[i:j])
-                i = j
+                j = _DIGIT_RUN.match(classes, i + 1).end()
+            tokens.append(s[i:j])
+            i = j
         else:
             # check multi-char operators
             two = s[i:i+2]
-            multi_ops = {'==','!=','<=','>=','+=','-=','*=','/=','&&','||','<<','>>','=>','->','::','%='}
-            if two in multi_ops:
+            if two in _MULTI_OPS:
                 tokens.append(two)
                 i += 2
             else:
-                tokens.append(c)
+                tokens.append(s[i])
                 i += 1
     return tokens
 
 # ---------- Step 5: rebuild with minimal safe spacing ----------
+# Tokens after which an original separator can be dropped safely
+_NO_SPACE_AFTER = ('(', '{', '[', '.', ',', ';')
+
 def rebuild_minimal(tokens: List[str]) -> str:
     out_tokens: List[str] = []
-    prev = None
+    last_actual = None    # previous real (non-whitespace) token
+    sep_pending = False   # whitespace seen since last_actual
     for tok in tokens:
         if tok == ' ':
-            # we treat whitespace marker by deciding explicitly below; skip default handling
-            # set a marker that separation exists
-            if prev is None:
-                # leading whitespace -> ignore
-                continue
-            else:
-                # record marker by a special token; we'll decide to insert a space when needed
-                # represent separation by None placeholder
-                out_tokens.append(None)
-                prev = None  # we reset prev to force next token treated as first after sep
-                continue
-        # append current token
-        if not out_tokens:
-            out_tokens.append(tok)
-        else:
-            # previous actual token (skip None markers)
-            # find last token that is not None
-            last_actual = None
-            for t in reversed(out_tokens):
-                if t is not None:
-                    last_actual = t
-                    break
-            need_space = False
-            if last_actual is None:
-                # previous was only separators -> no forced last token
-                need_space = False
+            # leading whitespace -> ignore; otherwise remember that separation exists
+            if last_actual is not None:
+                sep_pending = True
+            continue
+        if last_actual is not None:
+            if sep_pending:
+                # there was whitespace: keep a single space unless last_actual
+                # is punctuation that binds without spaces
+                if last_actual not in _NO_SPACE_AFTER:
+                    out_tokens.append(' ')
             else:
                 a = last_actual
                 b = tok
                 # If both are alnum-like tokens -> need space: "uint public"
-                if is_alnum_token(a) and is_alnum_token(b):
-                    need_space = True
                 # If previous is ')' or '}' and current is alnum -> insert space: ") public"
-                elif a in (')','}') and is_alnum_token(b):
-                    need_space = True
-                # If previous is alnum and current is '(' -> no space (function call/decl)
-                elif is_alnum_token(a) and b == '(':
-                    need_space = False
-                # If prev is identifier and current is identifier-like but separated by punctuation before -> default no
-                else:
-                    need_space = False
-            # If we had a separator marker (None) at end of out_tokens, ensure at least one space
-            if out_tokens and out_tokens[-1] is None:
-                # remove marker and enforce a single space in output
-                out_tokens.pop()
-                # decide whether to actually output a space: if last_actual exists and not punctuation requiring no space
-                # We'll be conservative: put a space except when last_actual is '(' or last_actual is punctuation that binds without spaces
-                if last_actual not in ('(', '{', '[', '.', ',', ';'):
-                    out_tokens.append(' ')
-            else:
-                # when no explicit separator marker, add space only if need_space True
-                if need_space:
+                # Anything else (e.g. alnum followed by '(') -> no space
+                if is_alnum_token(b) and (a in (')', '}') or is_alnum_token(a)):
                     out_tokens.append(' ')
-            out_tokens.append(tok)
-        prev = tok
-    # join out tokens, skipping any remaining None
-    return ''.join([t for t in out_tokens if t is not None])
+        out_tokens.append(tok)
+        last_actual = tok
+        sep_pending = False
+    return ''.join(out_tokens)
 
-# ---------- Top-level scramble function ----------
-def scramble_format(source: str, solidity_version: str = "^0.8.30", remove_comments: bool = True, one_line: bool = True) -> str:
+# ---------- Step 6: streaming one-line writer ----------
+_WS_RUN = re.compile(r'\s+')
+
+class OneLineWriter:
     """
-    Main API:
-      - source: original solidity code
-      - solidity_version: pragma target version (default ^0.8.30)
-      - remove_comments: whether to delete comments (default True)
-      - one_line: whether output single-line (True) or insert minimal newlines (False)
+    Wraps a text stream and collapses whitespace on the fly, so that
+    writing segments through it gives the same text as
+    re.sub(r'\s+', ' ', ''.join(segments)).strip() without holding the result.
     """
-    parts = split_strings(source)
-    processed_parts: List[str] = []
-    for is_str, seg in parts:
+    def __init__(self, out: TextIO):
+        self.out = out
+        self.started = False      # something non-blank already written
+        self.pending_space = False
+
+    def write(self, text: str) -> None:
+        for i, piece in enumerate(_WS_RUN.split(text)):
+            if i > 0:
+                # a whitespace run separated this piece from the previous one
+                self.pending_space = True
+            if piece:
+                if self.pending_space and self.started:
+                    self.out.write(' ')
+                self.out.write(piece)
+                self.started = True
+                self.pending_space = False
+
+# ---------- Top-level scramble function ----------
+def _iter_processed_segments(source: str, solidity_version: str, remove_comments: bool):
+    for is_str, seg in split_strings(source):
         if is_str:
             # keep string exactly as-is
-            processed_parts.append(seg)
+            yield seg
         else:
             # handle comments removal
             working = seg
@@ -207,9 +216,26 @@ def scramble_format(source: str, solidity_version: str = "^0.8.30", remove_comme
             working = normalize_pragma(working, solidity_version=solidity_version)
             # tokenize and rebuild minimal spacing
             tokens = tokenize_non_string(working)
-            rebuilt = rebuild_minimal(tokens)
-            processed_parts.append(rebuilt)
-    result = ''.join(processed_parts)
+            yield rebuild_minimal(tokens)
+
+def scramble_format(source: str, solidity_version: str = "^0.8.30", remove_comments: bool = True, one_line: bool = True,
+                    out: Optional[TextIO] = None) -> Optional[str]:
+    """
+    Main API:
+      - source: original solidity code
+      - solidity_version: pragma target version (default ^0.8.30)
+      - remove_comments: whether to delete comments (default True)
+      - one_line: whether output single-line (True) or insert minimal newlines (False)
+      - out: optional text stream; if given, output is written there and None is returned.
+        In one-line mode segments are streamed as they are processed.
+    """
+    segments = _iter_processed_segments(source, solidity_version, remove_comments)
+    if out is not None and one_line:
+        writer = OneLineWriter(out)
+        for seg in segments:
+            writer.write(seg)
+        return None
+    result = ''.join(segments)
     if one_line:
         # collapse all newlines into space and then compress multiple spaces to single
         result = re.sub(r'[\r\n]+', ' ', result)
@@ -222,6 +248,9 @@ def scramble_format(source: str, solidity_version: str = "^0.8.30", remove_comme
         result = re.sub(r'\s*\}', '\n}', result)
         # compress multiple blank lines
         result = re.sub(r'\n\s*\n+', '\n', result)
+    if out is not None:
+        out.write(result)
+        return None
     return result
 
 # ---------- CLI ----------
@@ -235,9 +264,8 @@ def main():
     multi_line = '--multi-line' in sys.argv
     with open(input_path, 'r', encoding='utf-8') as f:
         src = f.read()
-    out = scramble_format(src, solidity_version="^0.8.30", one_line=not multi_line)
     with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(out)
+        scramble_format(src, solidity_version="^0.8.30", one_line=not multi_line, out=f)
     print(f"[OK] Scrambled layout written to {output_path}")
 
 if __name__ == "__main__":
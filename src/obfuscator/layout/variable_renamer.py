@@ -25,6 +25,7 @@ import re
 import hashlib #hash
 import json
 import argparse
+import heapq
 from typing import Set, Dict, Optional, List, Tuple
 from pathlib import Path # xử lí đường dãn dạng đối tượng
 
@@ -32,10 +33,44 @@ from pathlib import Path # xử lí đường dãn dạng đối tượng
 try:
     import solcx
     from solcx import compile_source, compile_files, install_solc, set_solc_version
+    _SOLCX_AVAILABLE = True
 except ImportError:
-    print("Error: py-solc-x not installed")
-    print("Please install: pip install py-solc-x")
-    sys.exit(1)
+    # Reported by check_dependencies() when the script runs; importers (demo.py)
+    # keep working without it
+    solcx = None
+    compile_source = compile_files = install_solc = set_solc_version = None
+    _SOLCX_AVAILABLE = False
+
+# Optional fast JSON serializer for AST dumps
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _dump_ast_json(ast: Dict, output_path: str):
+    """Write AST to a JSON file (orjson if available, else stdlib json)"""
+    if orjson is not None:
+        data = orjson.dumps(ast, option=orjson.OPT_INDENT_2)
+    else:
+        data = json.dumps(ast, indent=2, ensure_ascii=False).encode('utf-8')
+    with open(output_path, 'wb') as f:
+        f.write(data)
+
+
+def _compile_one(file_path: str, solc_version: str) -> Optional[Dict]:
+    """Compile a single file to AST (module-level so worker processes can pickle it)"""
+    try:
+        compiled = compile_files(
+            [file_path],
+            output_values=['ast'],
+            solc_version=solc_version
+        )
+        contract_name = list(compiled.keys())[0]
+        return compiled[contract_name]['ast']
+    except Exception as e:
+        print(f"Error compiling {file_path}: {e}")
+        return None
 
 
 # ============================================
@@ -47,6 +82,16 @@ class SolidityASTParser:
     Parse Solidity source code and extract identifiers using AST
     """
     
+    # Node types whose 'name' field is an identifier to obfuscate
+    _NAME_NODE_TYPES = frozenset({
+        'ContractDefinition', 'FunctionDefinition', 'VariableDeclaration',
+        'Identifier', 'ModifierDefinition', 'EventDefinition',
+        'StructDefinition', 'EnumDefinition', 'ErrorDefinition',
+    })
+    
+    # Special function names that must never be renamed
+    _SKIP_FUNC_NAMES = frozenset({'', 'constructor', 'fallback', 'receive'})
+    
     def __init__(self, solc_version: str = '0.8.30'):
         """
         Initialize AST Parser
@@ -74,13 +119,16 @@ class SolidityASTParser:
             print(f"Warning: Could not setup Solidity compiler: {e}")
             print("Will attempt to use default compiler")
     
-    def compile_to_ast(self, source_code: str = None, file_path: str = None) -> Dict:
+    def compile_to_ast(self, source_code: str = None, file_path: str = None,
+                       save_json: bool = False, json_path: str = None) -> Dict:
         """
         Compile Solidity source to AST
         
         Args:
             source_code: Solidity source code (takes priority if provided)
             file_path: Optional file path (used only if source_code is not provided)
+            save_json: Also write the AST to a JSON file (debugging aid)
+            json_path: Optional AST output path (default: derived from file_path)
             
         Returns:
             AST dictionary
@@ -110,21 +158,45 @@ class SolidityASTParser:
             else:
                 raise ValueError("Either source_code or valid file_path must be provided")
             
-            # Determine AST output path
-            if file_path:
-                ast_output_path=os.path.splitext(file_path)[0] + '_ast.json'
-            else:
-                ast_output_path='output_ast.json'
-
-            with open(ast_output_path, 'w', encoding='utf-8') as f:
-                json.dump(ast, f, indent=2, ensure_ascii=False)
-            # AST saved silently
+            if save_json:
+                # Determine AST output path
+                if json_path:
+                    ast_output_path = json_path
+                elif file_path:
+                    ast_output_path = os.path.splitext(file_path)[0] + '_ast.json'
+                else:
+                    ast_output_path = 'output_ast.json'
+                
+                _dump_ast_json(ast, ast_output_path)
+                # AST saved silently
             return ast
             
         except Exception as e:
             print(f"Error compiling source code: {e}")
             return None
     
+    def compile_batch(self, file_paths: List[str], max_workers: int = None) -> Dict[str, Optional[Dict]]:
+        """
+        Compile many Solidity files to AST in parallel
+        
+        Each file is an independent solc run, so the work is spread across
+        processes (JSON parsing of solc output holds the GIL).
+        
+        Args:
+            file_paths: Solidity files to compile
+            max_workers: Worker process count (default: CPU count)
+            
+        Returns:
+            Dictionary of {file_path: AST or None on failure}
+        """
+        if len(file_paths) <= 1:
+            return {path: _compile_one(path, self.solc_version) for path in file_paths}
+        
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            asts = executor.map(_compile_one, file_paths, [self.solc_version] * len(file_paths))
+            return dict(zip(file_paths, asts))
+    
     def extract_identifiers(self, ast: Dict) -> Set[str]:
         """
         Extract all identifiers from AST
@@ -145,82 +217,37 @@ class SolidityASTParser:
         
         return identifiers
     
-    def _traverse_ast(self, node, identifiers: Set[str]):
+    def _traverse_ast(self, root, identifiers: Set[str]):
         """
-        Recursively traverse AST tree
+        Traverse AST tree iteratively (explicit stack instead of recursion,
+        so deep ASTs cannot hit RecursionError)
         
         Args:
-            node: Current AST node
+            root: Root AST node
             identifiers: Set to collect identifiers
         """
-        if not isinstance(node, dict):
-            return
-        
-        node_type = node.get('nodeType')
-        
-        # Extract name from different node types
-        if node_type == 'ContractDefinition':
-            # Contract name
-            name = node.get('name')
-            if name:
-                identifiers.add(name)
-        
-        elif node_type == 'FunctionDefinition':
-            # Function name
-            name = node.get('name')
-            if name and name not in ['', 'constructor', 'fallback', 'receive']:
-                identifiers.add(name)
-        
-        elif node_type == 'VariableDeclaration':
-            # Variable name
-            name = node.get('name')
-            if name:
-                identifiers.add(name)
-        
-        elif node_type == 'Identifier':
-            # Identifier usage
-            name = node.get('name')
-            if name:
-                identifiers.add(name)
-        
-        elif node_type == 'ModifierDefinition':
-            # Modifier name
-            name = node.get('name')
-            if name:
-                identifiers.add(name)
-        
-        elif node_type == 'EventDefinition':
-            # Event name
-            name = node.get('name')
-            if name:
-                identifiers.add(name)
-        
-        elif node_type == 'StructDefinition':
-            # Struct name
-            name = node.get('name')
-            if name:
-                identifiers.add(name)
-        
-        elif node_type == 'EnumDefinition':
-            # Enum name
-            name = node.get('name')
-            if name:
-                identifiers.add(name)
-        
-        elif node_type == 'ErrorDefinition':
-            # Error name
-            name = node.get('name')
-            if name:
-                identifiers.add(name)
-        
-        # Recursively traverse children
-        for key, value in node.items():
-            if isinstance(value, dict):
-                self._traverse_ast(value, identifiers)
-            elif isinstance(value, list):
-                for item in value:
-                    if isinstance(item, dict):
-                        self._traverse_ast(item, identifiers)
+        name_node_types = self._NAME_NODE_TYPES
+        skip_func_names = self._SKIP_FUNC_NAMES
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if not isinstance(node, dict):
+                continue
+            
+            node_type = node.get('nodeType')
+            
+            # Extract name from declaration/usage node types
+            if node_type in name_node_types:
+                name = node.get('name')
+                if name and (node_type != 'FunctionDefinition' or name not in skip_func_names):
+                    identifiers.add(name)
+            
+            # Push children onto the worklist
+            for value in node.values():
+                if isinstance(value, dict):
+                    stack.append(value)
+                elif isinstance(value, list):
+                    stack.extend(value)
 
 
 # ============================================
@@ -232,11 +259,89 @@ class VariableRenamer:
     Rename variables, functions, and contracts using AST
     """
     
+    # All Solidity reserved keywords - khong can doi.
+    # Evaluated once at class definition instead of on every __init__.
+    # (A JIT such as Numba is no help here: the renamer is pure string
+    # processing, which Numba barely supports.)
+    _RESERVED_KEYWORDS: frozenset = frozenset({
+        # Types
+        'int', 'int8', 'int16', 'int24', 'int32', 'int40', 'int48', 'int56', 'int64',
+        'int72', 'int80', 'int88', 'int96', 'int104', 'int112', 'int120', 'int128',
+        'int136', 'int144', 'int152', 'int160', 'int168', 'int176', 'int184', 'int192',
+        'int200', 'int208', 'int216', 'int224', 'int232', 'int240', 'int248', 'int256',
+        'uint', 'uint8', 'uint16', 'uint24', 'uint32', 'uint40', 'uint48', 'uint56', 'uint64',
+        'uint72', 'uint80', 'uint88', 'uint96', 'uint104', 'uint112', 'uint120', 'uint128',
+        'uint136', 'uint144', 'uint152', 'uint160', 'uint168', 'uint176', 'uint184', 'uint192',
+        'uint200', 'uint208', 'uint216', 'uint224', 'uint232', 'uint240', 'uint248', 'uint256',
+        'address', 'bool', 'string', 
+        'bytes', 'bytes1', 'bytes2', 'bytes3', 'bytes4', 'bytes5', 'bytes6', 'bytes7', 'bytes8',
+        'bytes9', 'bytes10', 'bytes11', 'bytes12', 'bytes13', 'bytes14', 'bytes15', 'bytes16',
+        'bytes17', 'bytes18', 'bytes19', 'bytes20', 'bytes21', 'bytes22', 'bytes23', 'bytes24',
+        'bytes25', 'bytes26', 'bytes27', 'bytes28', 'bytes29', 'bytes30', 'bytes31', 'bytes32',
+        'mapping', 'struct', 'enum', 'array',
+        
+        # Keywords
+        'contract', 'interface', 'library', 'abstract',
+        'function', 'modifier', 'event', 'error',
+        'constructor', 'fallback', 'receive',
+        'is', 'override', 'virtual',
+        
+        # Visibility
+        'public', 'private', 'internal', 'external',
+        
+        # State mutability
+        'pure', 'view', 'payable', 'constant', 'immutable',
+        
+        # Storage
+        'storage', 'memory', 'calldata',
+        
+        # Control flow
+        'if', 'else', 'for', 'while', 'do', 'break', 'continue', 'return',
+        'try', 'catch', 'throw',
+        
+        # Error handling
+        'require', 'assert', 'revert',
+        
+        # Built-in variables and members
+        'msg', 'sender', 'value', 'data', 'sig', 'gas',
+        'block', 'blockhash', 'coinbase', 'difficulty', 'gaslimit',
+        'number', 'timestamp', 'chainid', 'basefee', 'prevrandao',
+        'tx', 'gasprice', 'origin',
+        'abi', 'decode', 'encode', 'encodePacked', 'encodeWithSelector',
+        'encodeWithSignature', 'encodeCall',
+        'this', 'super', 'now', 'selfdestruct', 'suicide',
+        
+        # Others
+        'import', 'pragma', 'using', 'emit', 'delete', 'new', 'var',
+        'true', 'false',
+        'wei', 'gwei', 'ether', 'finney', 'szabo',  # finney and szabo deprecated
+        'seconds', 'minutes', 'hours', 'days', 'weeks',  # weeks deprecated
+        
+        # Global functions
+        'addmod', 'mulmod', 'keccak256', 'sha256', 'ripemd160',
+        'ecrecover', 'type',
+        
+        # Type members
+        'length', 'push', 'pop',
+        'balance', 'transfer', 'send', 'call', 'delegatecall', 'staticcall',
+        'code', 'codehash',
+        'name', 'creationCode', 'runtimeCode',
+        'interfaceId', 'selector', 'min', 'max',
+        
+        # Reserved for future use
+        'after', 'alias', 'apply', 'auto', 'byte', 'case', 'copyof', 'default',
+        'define', 'final', 'implements', 'in', 'inline', 'let', 'macro', 'match',
+        'mutable', 'null', 'of', 'partial', 'promise', 'reference', 'relocatable',
+        'sealed', 'sizeof', 'static', 'supports', 'switch', 'typedef', 'typeof',
+        'unchecked',
+    })
+    
     def __init__(self, 
                  hash_algorithm: str = 'sha1',
                  prefix: str = 'OX',
                  hash_length: int = 38,
-                 solc_version: str = '0.8.30'):
+                 solc_version: str = '0.8.30',
+                 save_ast: bool = False):
         """
         Initialize Variable Renamer
         
@@ -245,10 +350,12 @@ class VariableRenamer:
             prefix: Prefix for obfuscated names
             hash_length: Length of hash suffix
             solc_version: Solidity compiler version
+            save_ast: Write the compiled AST next to the input file
         """
         self.hash_algorithm = hash_algorithm
         self.prefix = prefix
         self.hash_length = hash_length
+        self.save_ast = save_ast
         
         # Mapping table
         self.identifier_map: Dict[str, str] = {}
@@ -256,86 +363,8 @@ class VariableRenamer:
         # AST Parser
         self.ast_parser = SolidityASTParser(solc_version)
         
-        # Solidity keywords to protect
-        self.reserved_keywords = self._get_solidity_keywords()
-    
-    def _get_solidity_keywords(self) -> Set[str]:
-        """
-        Get all Solidity reserved keywords
-        Khong can doi 
-        """
-        return {
-            # Types
-            'int', 'int8', 'int16', 'int24', 'int32', 'int40', 'int48', 'int56', 'int64',
-            'int72', 'int80', 'int88', 'int96', 'int104', 'int112', 'int120', 'int128',
-            'int136', 'int144', 'int152', 'int160', 'int168', 'int176', 'int184', 'int192',
-            'int200', 'int208', 'int216', 'int224', 'int232', 'int240', 'int248', 'int256',
-            'uint', 'uint8', 'uint16', 'uint24', 'uint32', 'uint40', 'uint48', 'uint56', 'uint64',
-            'uint72', 'uint80', 'uint88', 'uint96', 'uint104', 'uint112', 'uint120', 'uint128',
-            'uint136', 'uint144', 'uint152', 'uint160', 'uint168', 'uint176', 'uint184', 'uint192',
-            'uint200', 'uint208', 'uint216', 'uint224', 'uint232', 'uint240', 'uint248', 'uint256',
-            'address', 'bool', 'string', 
-            'bytes', 'bytes1', 'bytes2', 'bytes3', 'bytes4', 'bytes5', 'bytes6', 'bytes7', 'bytes8',
-            'bytes9', 'bytes10', 'bytes11', 'bytes12', 'bytes13', 'bytes14', 'bytes15', 'bytes16',
-            'bytes17', 'bytes18', 'bytes19', 'bytes20', 'bytes21', 'bytes22', 'bytes23', 'bytes24',
-            'bytes25', 'bytes26', 'bytes27', 'bytes28', 'bytes29', 'bytes30', 'bytes31', 'bytes32',
-            'mapping', 'struct', 'enum', 'array',
-            
-            # Keywords
-            'contract', 'interface', 'library', 'abstract',
-            'function', 'modifier', 'event', 'error',
-            'constructor', 'fallback', 'receive',
-            'is', 'override', 'virtual',
-            
-            # Visibility
-            'public', 'private', 'internal', 'external',
-            
-            # State mutability
-            'pure', 'view', 'payable', 'constant', 'immutable',
-            
-            # Storage
-            'storage', 'memory', 'calldata',
-            
-            # Control flow
-            'if', 'else', 'for', 'while', 'do', 'break', 'continue', 'return',
-            'try', 'catch', 'throw',
-            
-            # Error handling
-            'require', 'assert', 'revert',
-            
-            # Built-in variables and members
-            'msg', 'sender', 'value', 'data', 'sig', 'gas',
-            'block', 'blockhash', 'coinbase', 'difficulty', 'gaslimit',
-            'number', 'timestamp', 'chainid', 'basefee', 'prevrandao',
-            'tx', 'gasprice', 'origin',
-            'abi', 'decode', 'encode', 'encodePacked', 'encodeWithSelector',
-            'encodeWithSignature', 'encodeCall',
-            'this', 'super', 'now', 'selfdestruct', 'suicide',
-            
-            # Others
-            'import', 'pragma', 'using', 'emit', 'delete', 'new', 'var',
-            'true', 'false',
-            'wei', 'gwei', 'ether', 'finney', 'szabo',  # finney and szabo deprecated
-            'seconds', 'minutes', 'hours', 'days', 'weeks',  # weeks deprecated
-            
-            # Global functions
-            'addmod', 'mulmod', 'keccak256', 'sha256', 'ripemd160',
-            'ecrecover', 'type',
-            
-            # Type members
-            'length', 'push', 'pop',
-            'balance', 'transfer', 'send', 'call', 'delegatecall', 'staticcall',
-            'code', 'codehash',
-            'name', 'creationCode', 'runtimeCode',
-            'interfaceId', 'selector', 'min', 'max',
-            
-            # Reserved for future use
-            'after', 'alias', 'apply', 'auto', 'byte', 'case', 'copyof', 'default',
-            'define', 'final', 'implements', 'in', 'inline', 'let', 'macro', 'match',
-            'mutable', 'null', 'of', 'partial', 'promise', 'reference', 'relocatable',
-            'sealed', 'sizeof', 'static', 'supports', 'switch', 'typedef', 'typeof',
-            'unchecked',
-        }
+        # Solidity keywords to protect (shared, built once at import)
+        self.reserved_keywords = self._RESERVED_KEYWORDS
     
     def generate_hash_name(self, original_name: str) -> str:
         """
@@ -348,18 +377,12 @@ class VariableRenamer:
             Hashed name with prefix
         """
         # Select hash function
-        if self.hash_algorithm == 'sha1':
-            hash_obj = hashlib.sha1(original_name.encode('utf-8'))
-        elif self.hash_algorithm == 'sha256':
-            hash_obj = hashlib.sha256(original_name.encode('utf-8'))
-        elif self.hash_algorithm == 'md5':
-            hash_obj = hashlib.md5(original_name.encode('utf-8'))
-        else:
+        if self.hash_algorithm not in ('sha1', 'sha256', 'md5'):
             raise ValueError(f"Unsupported algorithm: {self.hash_algorithm}")
+        raw = hashlib.new(self.hash_algorithm, original_name.encode('utf-8')).digest()
         
-        # Get hex digest and truncate
-        hash_hex = hash_obj.hexdigest()
-        hash_part = hash_hex[:self.hash_length]
+        # Hex-encode only the bytes we keep, then trim to nibbles
+        hash_part = raw[:(self.hash_length + 1) // 2].hex()[:self.hash_length]
         
         # Add prefix
         return f"{self.prefix}{hash_part}"
@@ -376,7 +399,7 @@ class VariableRenamer:
             Set of identifier names
         """
         # Compile to AST - source_code takes priority to use transformed code
-        ast = self.ast_parser.compile_to_ast(source_code, file_path)
+        ast = self.ast_parser.compile_to_ast(source_code, file_path, save_json=self.save_ast)
         
         if not ast:
             print("Warning: Failed to parse AST, falling back to regex")
@@ -436,39 +459,28 @@ class VariableRenamer:
             if identifier not in self.identifier_map:
                 self.identifier_map[identifier] = self.generate_hash_name(identifier)
         
-        # Sort by length (longest first) to avoid partial replacements
-        sorted_identifiers = sorted(identifiers, key=len, reverse=True)
-        
-        obfuscated_code = source_code
-        
-        # Replace each identifier
-        for original in sorted_identifiers:
-            obfuscated = self.identifier_map[original]
-            
-            # Use word boundary to match complete words only
-            pattern = r'\b' + re.escape(original) + r'\b'
-            
-            # Replace
-            obfuscated_code = re.sub(pattern, obfuscated, obfuscated_code)
-        
-        return obfuscated_code
+        return self._replace_identifiers(source_code, identifiers)
     
-    def obfuscate_from_source(self, source_code: str, ast_path: str = None) -> str:
+    def obfuscate_from_source(self, source_code: str, ast_path: str = None, ast: Optional[Dict] = None) -> str:
         """
         BiAn-style obfuscation: use pre-generated AST from progressive workflow
         
         Args:
             source_code: Current transformed source code
             ast_path: Path to pre-generated AST file from previous step
+            ast: Already-parsed AST dict; used instead of reading ast_path
             
         Returns:
             Obfuscated code with variables renamed
         """
-        if ast_path and os.path.exists(ast_path):
+        if ast is not None or (ast_path and os.path.exists(ast_path)):
             # Load pre-generated AST
             try:
-                with open(ast_path, 'r', encoding='utf-8') as f:
-                    ast_data = json.load(f)
+                if ast is not None:
+                    ast_data = ast
+                else:
+                    with open(ast_path, 'r', encoding='utf-8') as f:
+                        ast_data = json.load(f)
                 
                 # Extract identifiers directly from loaded AST
                 identifiers = self.ast_parser.extract_identifiers(ast_data)
@@ -494,22 +506,29 @@ class VariableRenamer:
             if identifier not in self.identifier_map:
                 self.identifier_map[identifier] = self.generate_hash_name(identifier)
         
-        # Sort by length (longest first) to avoid partial replacements
-        sorted_identifiers = sorted(identifiers, key=len, reverse=True)
-        
-        obfuscated_code = source_code
+        return self._replace_identifiers(source_code, identifiers)
+    
+    def _replace_identifiers(self, source_code: str, identifiers: Set[str]) -> str:
+        """
+        Replace all identifiers in a single pass over the source
         
-        # Replace each identifier
-        for original in sorted_identifiers:
-            obfuscated = self.identifier_map[original]
-            
-            # Use word boundary to match complete words only
-            pattern = r'\b' + re.escape(original) + r'\b'
+        Args:
+            source_code: Solidity source code
+            identifiers: Identifiers to replace (must be in identifier_map)
             
-            # Replace
-            obfuscated_code = re.sub(pattern, obfuscated, obfuscated_code)
+        Returns:
+            Code with identifiers replaced by their hashed names
+        """
+        # One alternation with word boundaries to match complete words only;
+        # re.sub then builds the output string once instead of per identifier.
+        # The \b anchors on both sides mean only the alternative spanning the
+        # whole word can match, so no longest-first sort is needed.
+        pattern = re.compile(
+            r'\b(?:' + '|'.join(re.escape(name) for name in identifiers) + r')\b'
+        )
+        identifier_map = self.identifier_map
         
-        return obfuscated_code
+        return pattern.sub(lambda m: identifier_map[m.group(0)], source_code)
     
     def get_mapping(self) -> Dict[str, str]:
         """
@@ -540,8 +559,13 @@ class VariableRenamer:
 def read_file(file_path: str) -> str:
     """Read file content"""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return f.read()
+        # Read raw bytes in one go and decode once, bypassing the text-mode wrapper
+        with open(file_path, 'rb') as f:
+            text = f.read().decode('utf-8')
+        # Keep the universal-newline behaviour of text mode
+        if '\r' in text:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        return text
     except FileNotFoundError:
         print(f"Error: File not found: {file_path}")
         sys.exit(1)
@@ -556,8 +580,9 @@ def write_file(file_path: str, content: str):
         # Create parent directory if needed
         Path(file_path).parent.mkdir(parents=True, exist_ok=True)
         
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(content)
+        # One bulk write of the encoded bytes through a 1 MB buffer
+        with open(file_path, 'wb', buffering=1 << 20) as f:
+            f.write(content.encode('utf-8'))
     except Exception as e:
         print(f"Error writing file: {e}")
         sys.exit(1)
@@ -583,51 +608,57 @@ def print_summary(original_size: int,
                   num_identifiers: int,
                   elapsed_time: float):
     """Print summary statistics"""
-    print("\n" + "="*70)
-    print("OBFUSCATION SUMMARY")
-    print("="*70)
-    print(f"Original size:        {original_size:,} characters")
-    print(f"Obfuscated size:      {obfuscated_size:,} characters")
-    print(f"Size change:          {obfuscated_size - original_size:+,} characters")
-    print(f"Identifiers renamed:  {num_identifiers}")
-    print(f"Processing time:      {elapsed_time:.3f} seconds")
-    print("="*70)
+    # Build the whole block and write it once instead of one print per line
+    lines = [
+        "\n" + "="*70,
+        "OBFUSCATION SUMMARY",
+        "="*70,
+        f"Original size:        {original_size:,} characters",
+        f"Obfuscated size:      {obfuscated_size:,} characters",
+        f"Size change:          {obfuscated_size - original_size:+,} characters",
+        f"Identifiers renamed:  {num_identifiers}",
+        f"Processing time:      {elapsed_time:.3f} seconds",
+        "="*70,
+    ]
+    sys.stdout.write("\n".join(lines) + "\n")
+    sys.stdout.flush()
 
 
 def print_mapping_preview(mapping: Dict[str, str], max_items: int = 10):
     """Print preview of mapping table"""
-    print("\n" + "="*70)
-    print("MAPPING TABLE (Preview)")
-    print("="*70)
-    print(f"{'Original':<25} → {'Obfuscated'}")
-    print("-"*70)
+    lines = [
+        "\n" + "="*70,
+        "MAPPING TABLE (Preview)",
+        "="*70,
+        f"{'Original':<25} → {'Obfuscated'}",
+        "-"*70,
+    ]
     
-    items = list(mapping.items())
-    for i, (original, obfuscated) in enumerate(sorted(items)):
-        if i >= max_items:
-            print(f"... and {len(items) - max_items} more")
-            break
-        print(f"{original:<25} → {obfuscated}")
+    # Only the first max_items in sorted order are shown: no need to sort everything
+    for original, obfuscated in heapq.nsmallest(max_items, mapping.items()):
+        lines.append(f"{original:<25} → {obfuscated}")
+    if len(mapping) > max_items:
+        lines.append(f"... and {len(mapping) - max_items} more")
     
-    print("="*70)
+    lines.append("="*70)
+    sys.stdout.write("\n".join(lines) + "\n")
+    sys.stdout.flush()
 
 
 def check_dependencies():
-    """Check if required dependencies are installed"""
-    try:
-        import solcx
+    """Check if required dependencies are installed (resolved once at import time)"""
+    if _SOLCX_AVAILABLE:
         return True
-    except ImportError:
-        print("\n" + "="*70)
-        print("ERROR: Missing Required Dependency")
-        print("="*70)
-        print("\nThis script requires 'py-solc-x' to be installed.")
-        print("\nPlease install it using:")
-        print("  pip install py-solc-x")
-        print("\nOr install all requirements:")
-        print("  pip install py-solc-x")
-        print("\n" + "="*70)
-        return False
+    print("\n" + "="*70)
+    print("ERROR: Missing Required Dependency")
+    print("="*70)
+    print("\nThis script requires 'py-solc-x' to be installed.")
+    print("\nPlease install it using:")
+    print("  pip install py-solc-x")
+    print("\nOr install all requirements:")
+    print("  pip install py-solc-x")
+    print("\n" + "="*70)
+    return False
 
 
 # ============================================
@@ -706,6 +737,12 @@ Note: This version uses AST (Abstract Syntax Tree) parsing for more accurate
         help='Solidity compiler version (default: 0.8.30)'
     )
     
+    parser.add_argument(
+        '--save-ast',
+        action='store_true',
+        help='Also write the compiled AST to <input>_ast.json (debugging)'
+    )
+    
     parser.add_argument(
         '--quiet',
         '-q',
@@ -737,6 +774,7 @@ Note: This version uses AST (Abstract Syntax Tree) parsing for more accurate
         print(f"  Prefix:          {args.prefix}")
         print(f"  Hash length:     {args.length}")
         print(f"  Solc version:    {args.solc_version}")
+        print(f"  Save AST:        {'Yes' if args.save_ast else 'No'}")
         print(f"  Method:          AST parsing")
         print()
     
@@ -763,7 +801,8 @@ Note: This version uses AST (Abstract Syntax Tree) parsing for more accurate
             hash_algorithm=args.algorithm,
             prefix=args.prefix,
             hash_length=args.length,
-            solc_version=args.solc_version
+            solc_version=args.solc_version,
+            save_ast=args.save_ast
         )
     except Exception as e:
         print(f"Error initializing renamer: {e}")
@@ -0,0 +1,114 @@
+"""
+Regression tests for PreprocessingObfuscator.apply_preprocessing.
+The solc AST is built by hand (only the fields the pass reads), so no compiler is needed.
+Run with: python -m unittest discover -s test
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'obfuscator', 'control-flow'))
+
+from preprocessing_obfuscator import PreprocessingObfuscator
+
+SOURCE = """pragma solidity ^0.8.0;
+contract C {
+    modifier nz(uint a) { require(a != 0); _; }
+    function g(uint a) internal pure nz(a) returns (uint) { return 100 / a; }
+    function h(uint y) public pure returns (uint) { return g(y); }
+}
+"""
+
+
+def _src(text, after=""):
+    """solc src string of the first occurrence of text (searched from after)."""
+    data = SOURCE.encode('utf-8')
+    start = data.index(text.encode('utf-8'), data.index(after.encode('utf-8')))
+    return f"{start}:{len(text.encode('utf-8'))}:0"
+
+
+def _build_ast():
+    mod_sig = "modifier nz(uint a)"
+    g_sig = "function g(uint a)"
+    h_sig = "function h(uint y)"
+    modifier = {
+        'nodeType': 'ModifierDefinition', 'id': 10, 'name': 'nz',
+        'src': _src("modifier nz(uint a) { require(a != 0); _; }"),
+        'body': {
+            'nodeType': 'Block', 'id': 11, 'src': _src("{ require(a != 0); _; }", mod_sig),
+            'statements': [
+                {'nodeType': 'ExpressionStatement', 'id': 12, 'src': _src("require(a != 0);", mod_sig)},
+                {'nodeType': 'PlaceholderStatement', 'id': 13, 'src': _src("_", "require(a != 0);")},
+            ],
+        },
+    }
+    g = {
+        'nodeType': 'FunctionDefinition', 'id': 20, 'name': 'g',
+        'visibility': 'internal', 'stateMutability': 'pure',
+        'src': _src("function g(uint a) internal pure nz(a) returns (uint) { return 100 / a; }"),
+        'parameters': {'nodeType': 'ParameterList', 'id': 21,
+                       'parameters': [{'nodeType': 'VariableDeclaration', 'id': 22, 'name': 'a',
+                                       'src': _src("uint a", g_sig)}]},
+        'modifiers': [{'nodeType': 'ModifierInvocation', 'id': 23, 'src': _src("nz(a)", g_sig),
+                       'modifierName': {'nodeType': 'IdentifierPath', 'id': 24, 'name': 'nz',
+                                        'referencedDeclaration': 10, 'src': _src("nz", g_sig)}}],
+        'body': {
+            'nodeType': 'Block', 'id': 25, 'src': _src("{ return 100 / a; }", g_sig),
+            'statements': [{
+                'nodeType': 'Return', 'id': 26, 'src': _src("return 100 / a;", g_sig),
+                'expression': {
+                    'nodeType': 'BinaryOperation', 'id': 27, 'src': _src("100 / a", g_sig),
+                    'leftExpression': {'nodeType': 'Literal', 'id': 28, 'src': _src("100", g_sig)},
+                    'rightExpression': {'nodeType': 'Identifier', 'id': 29, 'name': 'a',
+                                        'referencedDeclaration': 22, 'src': _src("a", "100 / ")},
+                },
+            }],
+        },
+    }
+    h = {
+        'nodeType': 'FunctionDefinition', 'id': 30, 'name': 'h',
+        'visibility': 'public', 'stateMutability': 'pure',
+        'src': _src("function h(uint y) public pure returns (uint) { return g(y); }"),
+        'parameters': {'nodeType': 'ParameterList', 'id': 31,
+                       'parameters': [{'nodeType': 'VariableDeclaration', 'id': 32, 'name': 'y',
+                                       'src': _src("uint y", h_sig)}]},
+        'modifiers': [],
+        'body': {
+            'nodeType': 'Block', 'id': 33, 'src': _src("{ return g(y); }", h_sig),
+            'statements': [{
+                'nodeType': 'Return', 'id': 34, 'src': _src("return g(y);", h_sig),
+                'expression': {
+                    'nodeType': 'FunctionCall', 'id': 35, 'src': _src("g(y)", h_sig),
+                    'expression': {'nodeType': 'Identifier', 'id': 36, 'name': 'g',
+                                   'referencedDeclaration': 20, 'src': _src("g", h_sig + " public pure returns (uint) { return ")},
+                    'arguments': [{'nodeType': 'Identifier', 'id': 37, 'name': 'y',
+                                   'referencedDeclaration': 32, 'src': _src("y", "g(")}],
+                },
+            }],
+        },
+    }
+    contract = {'nodeType': 'ContractDefinition', 'id': 2, 'name': 'C', 'src': _src(SOURCE[SOURCE.index("contract"):].rstrip()),
+                'nodes': [modifier, g, h]}
+    return {'nodeType': 'SourceUnit', 'id': 1, 'src': f"0:{len(SOURCE.encode('utf-8'))}:0", 'nodes': [contract]}
+
+
+class ApplyPreprocessingTest(unittest.TestCase):
+    def setUp(self):
+        self.obfuscator = PreprocessingObfuscator()
+        ast = _build_ast()
+        self.obfuscator._get_ast = lambda source_code: ast
+
+    def test_call_to_function_with_inlined_modifier_is_kept(self):
+        result = self.obfuscator.apply_preprocessing(SOURCE)
+        h_body = result[result.index("function h"):]
+        self.assertIn("return g(y);", h_body)
+        self.assertNotIn("100 / y", result)
+        # the modifier itself is still inlined into g
+        g_text = result[result.index("function g"):result.index("function h")]
+        self.assertIn("require(a != 0);", g_text)
+        self.assertNotIn("nz(a)", g_text)
+
+
+if __name__ == '__main__':
+    unittest.main()